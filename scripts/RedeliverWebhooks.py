@@ -1,73 +1,267 @@
-import requests
 import json
 import os
+import sys
+import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 
-parser = argparse.ArgumentParser()
-parser.add_argument(dest='repo', help="Tenant repo name")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "webhooks"))
+from githubClient import GitHubClient, GitHubApiError
+from incrementalState import delivered_at_epoch
+from deliveryRecord import attempt_outcome, TIMED_OUT, FAILED
 
-tenant_repo = parser.parse_args().repo
+DEFAULT_LOOKBACK_HOURS = 24
+DEFAULT_CONCURRENCY = 4
+DEFAULT_OWNER = "Fiserv"
+PER_PAGE = 100
 
 github_auth_token = os.environ.get("TEST_GITHUB_AUTH_TOKEN")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Redeliver failed webhook deliveries of a tenant repo, or of many in one sweep")
+    parser.add_argument(dest='repo', nargs="?", help="Tenant repo name (owner/repo)")
+    batch = parser.add_mutually_exclusive_group()
+    batch.add_argument("--org", help="Sweep every non-archived repo of this organization")
+    batch.add_argument("--repos-file", help=f"Sweep the repos listed in this file, one per line ('{DEFAULT_OWNER}/' is assumed "
+                                            "for names without an owner; blank lines and lines starting with # are ignored)")
+    parser.add_argument("--lookback-hours", type=float, default=DEFAULT_LOOKBACK_HOURS,
+                        help=f"Only consider deliveries from the last N hours (default: {DEFAULT_LOOKBACK_HOURS})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Number of repos scanned and redeliveries sent in parallel (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--dry-run", action="store_true", help="Report the deliveries that would be redelivered without sending them")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if bool(args.repo) + bool(args.org) + bool(args.repos_file) != 1:
+        parser.error("specify exactly one of repo, --org or --repos-file")
+    return args
+
+def list_org_repos(client, org):
+    """
+    Returns the full names of the non-archived repos of `org`; archived repos cannot receive pushes.
+    """
+    repos = []
+    for page in client.paginate(f"orgs/{org}/repos", params={"per_page": PER_PAGE, "type": "all"}):
+        repos.extend(repo["full_name"] for repo in page if not repo.get("archived") and not repo.get("disabled"))
+    return repos
+
+def read_repos_file(path):
+    repos = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            repo = line if "/" in line else f"{DEFAULT_OWNER}/{line}"
+            if repo not in repos:
+                repos.append(repo)
+    return repos
+
 # Function to get a list of hook IDs for the repository
-def get_hook_ids():
-    url = f"https://api.github.com/repos/{tenant_repo}/hooks?page=1&per_page=1"
-    headers = {
-        "Authorization": f"Bearer {github_auth_token}",
-        "Accept": "application/vnd.github.v3+json",
-        "X-GitHub-Api-Version": "2022-11-28"
-    }
-     
-    response = requests.get(url, headers=headers)
-    #response.raise_for_status()
+def get_hook_ids(client, tenant_repo):
+    """
+    Returns the hook ids of a repo, raising GitHubApiError if they cannot be listed.
+    """
     hook_ids = []
+    for hooks in client.paginate(f"repos/{tenant_repo}/hooks", params={"per_page": PER_PAGE}):
+        hook_ids.extend(hook["id"] for hook in hooks)
+    return hook_ids
 
-    status = response.status_code
-    print ('response: ', status)
+def get_recent_deliveries(client, tenant_repo, hook_id, since):
+    """
+    Returns the deliveries of a hook delivered at or after the `since` epoch, newest first.
+    Deliveries are listed newest first, so paging stops at the first page reaching past `since`.
+    """
+    recent_deliveries = []
+    for deliveries in client.paginate(f"repos/{tenant_repo}/hooks/{hook_id}/deliveries", params={"per_page": PER_PAGE}):
+        for delivery in deliveries:
+            delivered_at = delivered_at_epoch(delivery)
+            if delivered_at is not None and delivered_at < since:
+                return recent_deliveries
+            recent_deliveries.append(delivery)
+    return recent_deliveries
 
-    if status == 200:
-        hooks = response.json()
-        hook_ids = [hook["id"] for hook in hooks]
+def latest_attempts(deliveries):
+    """
+    Collapses redelivery attempts by guid, keeping the most recent attempt of each delivery.
+    """
+    latest = {}
+    for delivery in deliveries:
+        guid = delivery.get("guid") or delivery["id"]
+        current = latest.get(guid)
+        if current is None or delivery["id"] > current["id"]:
+            latest[guid] = delivery
+    return list(latest.values())
 
-    return hook_ids
+def find_failed_deliveries(client, tenant_repo, hook_id, since):
+    """
+    Returns the deliveries of a hook whose latest attempt still failed: timed out (including
+    5xx responses) or failed, as classified by attempt_outcome.
+    """
+    deliveries = get_recent_deliveries(client, tenant_repo, hook_id, since)
+    attempts = latest_attempts(deliveries)
+    failed = [delivery for delivery in attempts if attempt_outcome(delivery.get("status_code")) in (TIMED_OUT, FAILED)]
+    # One write per line, so lines of repos scanned concurrently do not interleave
+    print(f"{tenant_repo} hook ID {hook_id}: {len(deliveries)} attempts, {len(attempts)} deliveries, {len(failed)} still failing\n",
+          end="")
+    return failed
+
+def redeliver(client, tenant_repo, hook_id, delivery):
+    delivery_id = delivery["id"]
+    redeliver_url = f"repos/{tenant_repo}/hooks/{hook_id}/deliveries/{delivery_id}/attempts"
+    try:
+        response = client.post(redeliver_url)
+    except requests.RequestException as e:
+        # Redeliveries are not retried: GitHub may have carried this one out before the connection failed
+        print(f"Redelivery of delivery ID {delivery_id} for hook ID {hook_id} got no response, not retrying: {e!r}\n", end="")
+        return False
+    if response.status_code not in (200, 201, 202):
+        print(f"Failed to redeliver delivery ID {delivery_id} for hook ID {hook_id}: {response.status_code} {response.text}\n", end="")
+        return False
+    print(f"Redelivered delivery ID {delivery_id} for {tenant_repo} hook ID {hook_id}\n", end="")
+    return True
+
+def send_redeliveries(client, failed, concurrency=DEFAULT_CONCURRENCY, dry_run=False):
+    """
+    Redelivers (tenant_repo, hook_id, delivery) items with at most `concurrency` redeliveries in
+    flight. Returns one result per item: True if redelivered, False if it failed, None in a dry run.
+    """
+    if dry_run:
+        for tenant_repo, hook_id, delivery in failed:
+            print(f"[dry-run] Would redeliver delivery ID {delivery['id']} (guid {delivery.get('guid')}, "
+                  f"event {delivery.get('event')}, status {delivery.get('status_code')}) for {tenant_repo} hook ID {hook_id}")
+        return [None] * len(failed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda item: redeliver(client, *item), failed))
+
+def scan_repo(client, tenant_repo, since):
+    """
+    Returns the hook ids of a repo and its failed (tenant_repo, hook_id, delivery) items.
+    Raises GitHubApiError if the hooks cannot be listed.
+    """
+    hook_ids = get_hook_ids(client, tenant_repo)
+    failed = []
+    for hook_id in hook_ids:
+        failed.extend((tenant_repo, hook_id, delivery) for delivery in find_failed_deliveries(client, tenant_repo, hook_id, since))
+    return hook_ids, failed
 
 # Function to redeliver failed deliveries
-def redeliver_failed_deliveries(hook_id):
-    url = f"https://api.github.com/repos/{tenant_repo}/hooks/{hook_id}/deliveries?per_page=1"
-    headers = {
-        "Authorization": f"Bearer {github_auth_token}",
-        "Accept": "application/vnd.github.v3+json",
-        "X-GitHub-Api-Version": "2022-11-28"
+def redeliver_failed_deliveries(client, tenant_repo, since, concurrency=DEFAULT_CONCURRENCY, dry_run=False):
+    """
+    Scans a repo like the sweep does and redelivers the failed deliveries of all its hooks with
+    at most `concurrency` redeliveries in flight. Returns a summary of the run.
+    """
+    hook_ids, failed = scan_repo(client, tenant_repo, since)
+    print("Hook IDs:", hook_ids)
+    summary = {"hooks": len(hook_ids), "failed": len(failed), "redelivered": 0, "errors": 0}
+
+    results = send_redeliveries(client, failed, concurrency, dry_run)
+    summary["redelivered"] = sum(1 for result in results if result)
+    summary["errors"] = sum(1 for result in results if result is False)
+    return summary
+
+def sweep_repos(client, repos, since, concurrency=DEFAULT_CONCURRENCY, dry_run=False):
+    """
+    Scans `concurrency` repos at a time and then redelivers the failed deliveries of all of them
+    through the same pool. Every repo shares the client, so its connection pool and rate limit
+    budget. Returns a summary per repo and the totals of the sweep.
+    """
+    def scan(tenant_repo):
+        try:
+            return scan_repo(client, tenant_repo, since)
+        except (GitHubApiError, requests.RequestException) as e:
+            print(f"Failed to scan {tenant_repo}: {e}\n", end="")
+            return None
+
+    repo_summaries = {repo: {"hooks": 0, "failed": 0, "redelivered": 0, "errors": 0, "scan_error": False} for repo in repos}
+    failed = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for tenant_repo, result in zip(repos, executor.map(scan, repos)):
+            if result is None:
+                repo_summaries[tenant_repo]["scan_error"] = True
+                continue
+            hook_ids, repo_failed = result
+            repo_summaries[tenant_repo]["hooks"] = len(hook_ids)
+            repo_summaries[tenant_repo]["failed"] = len(repo_failed)
+            failed.extend(repo_failed)
+
+    for (tenant_repo, _, _), result in zip(failed, send_redeliveries(client, failed, concurrency, dry_run)):
+        if result:
+            repo_summaries[tenant_repo]["redelivered"] += 1
+        elif result is False:
+            repo_summaries[tenant_repo]["errors"] += 1
+
+    totals = {
+        "repos": len(repos),
+        "repos_with_failures": sum(1 for summary in repo_summaries.values() if summary["failed"]),
+        "scan_errors": sum(1 for summary in repo_summaries.values() if summary["scan_error"]),
+        "hooks": sum(summary["hooks"] for summary in repo_summaries.values()),
+        "failed": len(failed),
+        "redelivered": sum(summary["redelivered"] for summary in repo_summaries.values()),
+        "errors": sum(summary["errors"] for summary in repo_summaries.values())
     }
+    return repo_summaries, totals
+
+def print_sweep_summary(repo_summaries, totals):
+    affected = {repo: summary for repo, summary in repo_summaries.items() if summary["failed"] or summary["scan_error"]}
+    if affected:
+        width = max(len(repo) for repo in affected)
+        print(f"{'Repo'.ljust(width)}  hooks  failed  redelivered  errors")
+        for repo, summary in sorted(affected.items()):
+            if summary["scan_error"]:
+                print(f"{repo.ljust(width)}  scan failed")
+                continue
+            print(f"{repo.ljust(width)}  {summary['hooks']:>5}  {summary['failed']:>6}  {summary['redelivered']:>11}  "
+                  f"{summary['errors']:>6}")
+    else:
+        print("No failed deliveries found")
+    print("Summary:", json.dumps(totals))
+
+def sweep(args):
+    """
+    Runs a sweep and returns its totals.
+    """
+    client = GitHubClient(github_auth_token, pool_size=args.concurrency)
+    if args.org:
+        repos = list_org_repos(client, args.org)
+        print(f"Sweeping {len(repos)} repos of {args.org}")
+    else:
+        repos = read_repos_file(args.repos_file)
+        print(f"Sweeping {len(repos)} repos listed in {args.repos_file}")
+
+    since = time.time() - args.lookback_hours * 60 * 60
+    repo_summaries, totals = sweep_repos(client, repos, since, args.concurrency, args.dry_run)
+    print_sweep_summary(repo_summaries, totals)
+    print("GitHub API usage:", client.stats())
+    return totals
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.repo:
+        totals = sweep(args)
+        # Fail the scheduled job when repos could not be scanned or deliveries not redelivered
+        sys.exit(1 if totals["scan_errors"] or totals["errors"] else 0)
+    tenant_repo = args.repo
 
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    deliveries = response.json()
-    
-    for delivery in deliveries:
-        if delivery["status_code"] >= 400:
-            delivery_id = delivery["id"]
-            redeliver_url = f"https://api.github.com/repos/{tenant_repo}/hooks/{hook_id}/deliveries/{delivery_id}/attempts"
-            response = requests.post(redeliver_url, headers=headers)
-            response.raise_for_status()
-            print(f"Redelivered delivery ID {delivery_id} for hook ID {hook_id}")
- 
-            
-
-if __name__ == "__main__": 
-    
     print ('Retrying for the Tenant: ',tenant_repo)
 
     if github_auth_token:
         print("Secret Value FOUND.")
     else:
         print("Secret Value NOT found.")
-        
-    hook_ids = get_hook_ids()
- 
-    if hook_ids is not None:
-        print("Hook IDs:", hook_ids)
-    
-    for hook_id in hook_ids:
-        redeliver_failed_deliveries(hook_id)
\ No newline at end of file
+
+    client = GitHubClient(github_auth_token, pool_size=args.concurrency)
+
+    since = time.time() - args.lookback_hours * 60 * 60
+    try:
+        summary = redeliver_failed_deliveries(client, tenant_repo, since, args.concurrency, args.dry_run)
+    except (GitHubApiError, requests.RequestException) as e:
+        print(f"Failed to scan {tenant_repo}: {e}")
+        print("GitHub API usage:", client.stats())
+        sys.exit(1)
+    print("Summary:", json.dumps(summary))
+    print("GitHub API usage:", client.stats())
+    sys.exit(1 if summary["errors"] else 0)
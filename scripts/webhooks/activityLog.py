@@ -0,0 +1,240 @@
+import atexit
+import gzip
+import json
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LOG_LEVELS = {
+    "debug": DEBUG,
+    "info": INFO,
+    "warning": WARNING,
+    "error": ERROR
+}
+LOG_LEVEL_NAMES = {level: name for name, level in LOG_LEVELS.items()}
+LOG_FORMATS = ["text", "json"]
+LOG_BUFFER_SIZE = 64 * 1024
+# Uncompressed size at which the open segment of a log is sealed
+DEFAULT_SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+SEGMENT_EXTENSION = ".log"
+SEALED_SEGMENT_EXTENSION = ".log.gz"
+SEGMENT_FILE_MODE = 0o644
+
+def segment_base(filepath):
+    """
+    Returns the path segments of the log at `filepath` are named after:
+    `<dir>/activity_log_<date>_<env>.log` has segments `<dir>/activity_log_<date>_<env>.<n>.log[.gz]`.
+    """
+    return os.path.splitext(filepath)[0]
+
+def list_segments(filepath):
+    """
+    Returns (sequence number, path, sealed) of the existing segments of a log, in order.
+    """
+    base = segment_base(filepath)
+    directory = os.path.dirname(base) or "."
+    pattern = re.compile(re.escape(os.path.basename(base)) + r"\.(\d+)\.log(\.gz)?$")
+    segments = []
+    try:
+        filenames = os.listdir(directory)
+    except FileNotFoundError:
+        return segments
+    for filename in filenames:
+        match = pattern.match(filename)
+        if match:
+            segments.append((int(match.group(1)), os.path.join(os.path.dirname(base), filename), bool(match.group(2))))
+    return sorted(segments)
+
+def seal_segment(path):
+    """
+    Compresses an open segment into its sealed, gzip-compressed form and removes the open one.
+    The sealed segment is written atomically and without a timestamp, so equal content gives an equal file.
+    """
+    sealed_path = path[:-len(SEGMENT_EXTENSION)] + SEALED_SEGMENT_EXTENSION
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp, open(path, "rb") as source:
+            with gzip.GzipFile(filename="", mode="wb", fileobj=tmp, mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed)
+        os.chmod(tmp_path, SEGMENT_FILE_MODE)
+        os.replace(tmp_path, sealed_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.remove(path)
+    return sealed_path
+
+class ActivityLog:
+    """
+    Activity log written as a series of size-bounded, gzip-compressed segments.
+
+    Messages below `level` are dropped. Text lines are written exactly as logged; the `json`
+    format writes one JSON object per line with a timestamp and level. Lines go through a
+    buffered handle to the open segment, `<name>.<n>.log` next to `filepath`. Once it reaches
+    `segment_max_bytes`, and when seal() is called, the segment is compressed into
+    `<name>.<n>.log.gz` and never changes again; `on_seal(path)` is called for every segment
+    this log seals so the caller can upload it. close(), which runs automatically at
+    interpreter exit, only closes the open segment: the next run to write the log seals and
+    reports the segments earlier runs left open, while the ones they sealed were already reported.
+    """
+
+    def __init__(self, filepath, level=INFO, log_format="text", echo=True, on_seal=None,
+                 segment_max_bytes=DEFAULT_SEGMENT_MAX_BYTES):
+        self.filepath = filepath
+        self.level = level
+        self.log_format = log_format
+        self.echo = echo
+        self.on_seal = on_seal
+        self.segment_max_bytes = segment_max_bytes
+        self._file = None
+        self._segment_path = None
+        self._segment_bytes = 0
+        self._next_sequence = None
+        self._lock = threading.Lock()
+
+    def log(self, message, level=INFO, **fields):
+        if level < self.level:
+            return
+        if self.echo:
+            print(message)
+        if self.log_format == "json":
+            record = {
+                "time": datetime.now().isoformat(timespec="milliseconds"),
+                "level": LOG_LEVEL_NAMES.get(level, str(level)),
+                "message": message
+            }
+            record.update(fields)
+            line = json.dumps(record, default=str)
+        else:
+            line = message
+        with self._lock:
+            if self._file is None:
+                self._open_segment()
+            self._file.write(line + "\n")
+            self._segment_bytes += len(line) + 1
+            if self._segment_bytes >= self.segment_max_bytes:
+                self._seal()
+
+    def _open_segment(self):
+        if self._next_sequence is None:
+            self._next_sequence = 1
+            for sequence, path, sealed in list_segments(self.filepath):
+                if not sealed:
+                    path = seal_segment(path)
+                    if self.on_seal:
+                        self.on_seal(path)
+                self._next_sequence = sequence + 1
+        self._segment_path = f"{segment_base(self.filepath)}.{self._next_sequence:04d}{SEGMENT_EXTENSION}"
+        self._next_sequence += 1
+        self._file = open(self._segment_path, "a", buffering=LOG_BUFFER_SIZE)
+        self._segment_bytes = 0
+
+    def _seal(self):
+        self._file.close()
+        self._file = None
+        sealed_path = seal_segment(self._segment_path)
+        if self.on_seal:
+            self.on_seal(sealed_path)
+
+    def debug(self, message, **fields):
+        self.log(message, DEBUG, **fields)
+
+    def info(self, message, **fields):
+        self.log(message, INFO, **fields)
+
+    def warning(self, message, **fields):
+        self.log(message, WARNING, **fields)
+
+    def error(self, message, **fields):
+        self.log(message, ERROR, **fields)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def seal(self):
+        """
+        Seals the open segment, if any; the next line starts a new segment.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._seal()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+_settings = {"level": INFO, "log_format": "text", "echo": True, "on_seal": None,
+             "segment_max_bytes": DEFAULT_SEGMENT_MAX_BYTES}
+_logs = {}
+_logs_lock = threading.Lock()
+
+def configure(level=INFO, log_format="text", echo=True, on_seal=None, segment_max_bytes=DEFAULT_SEGMENT_MAX_BYTES):
+    """
+    Sets the options of activity logs created afterwards and of those already open.
+    """
+    _settings.update(level=level, log_format=log_format, echo=echo, on_seal=on_seal, segment_max_bytes=segment_max_bytes)
+    with _logs_lock:
+        for activity_log in _logs.values():
+            activity_log.level = level
+            activity_log.log_format = log_format
+            activity_log.echo = echo
+            activity_log.on_seal = on_seal
+            activity_log.segment_max_bytes = segment_max_bytes
+
+def get_activity_log(filepath):
+    """
+    Returns the shared ActivityLog for `filepath`, creating it on first use.
+    """
+    with _logs_lock:
+        activity_log = _logs.get(filepath)
+        if activity_log is None:
+            activity_log = ActivityLog(filepath, **_settings)
+            _logs[filepath] = activity_log
+        return activity_log
+
+def seal_all():
+    with _logs_lock:
+        activity_logs = list(_logs.values())
+    for activity_log in activity_logs:
+        activity_log.seal()
+
+def iter_lines(filepath):
+    """
+    Yields the lines of the log at `filepath` from all of its segments, oldest first, followed by
+    the lines of a log written as a single file before logs were segmented.
+    """
+    if os.path.exists(filepath):
+        with open(filepath, "r", errors="replace") as f:
+            yield from f
+    for _, path, sealed in list_segments(filepath):
+        with (gzip.open(path, "rt", errors="replace") if sealed else open(path, "r", errors="replace")) as f:
+            yield from f
+
+def close_all():
+    with _logs_lock:
+        activity_logs = list(_logs.values())
+    for activity_log in activity_logs:
+        activity_log.close()
+
+def _exit_on_sigterm(signum, frame):
+    # Turn a cancelled workflow step into a normal exit so buffered log lines are not lost
+    sys.exit(128 + signum)
+
+def install_exit_handlers():
+    atexit.register(close_all)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
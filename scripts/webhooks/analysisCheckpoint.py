@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import time
+
+from deliveryRecord import DELIVERY_RETENTION_SECONDS
+
+CHECKPOINT_FILENAME = "analysis_checkpoint"
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 30
+ARTIFACT_FILE_MODE = 0o644
+
+def get_checkpoint_filepath(artifacts_path, env):
+    return f"{artifacts_path}/{CHECKPOINT_FILENAME}_{env}.json"
+
+def atomic_write(filepath, content):
+    """
+    Replaces `filepath` with `content` through a temporary file in the same directory, so a
+    crash leaves either the previous or the new version of the file, never a truncated one.
+    """
+    directory = os.path.dirname(filepath) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp_path, ARTIFACT_FILE_MODE)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class AnalysisCheckpoint:
+    """
+    Progress of an environment's analysis, saved while the deliveries are paged through.
+
+    After every fully processed page of deliveries the checkpoint records the URL of the next
+    page, at most once per `interval_seconds`. It also records the most-recently-processed
+    timestamp the run started from: the watermark advances to the newest delivery on the first
+    page, so a resumed run has to keep filtering older pages against the original one. A run
+    that pages through to the end (or to the incremental cursor) marks the checkpoint complete.
+
+    With a `deadline` (time.monotonic() value) the run stops paging once it is reached, so a
+    large backlog is worked through over several runs started with --resume.
+
+    The checkpoint also carries the latest attempt ids of redelivered deliveries (see
+    AttemptChains), which outlive a pass and are kept as long as GitHub lists the deliveries.
+
+    The saved checkpoint holds no wall-clock time: a run that found nothing new saves the same
+    file as the previous one, so the artifact manifest does not upload it again.
+    """
+
+    def __init__(self, filepath, writer, interval_seconds=DEFAULT_CHECKPOINT_INTERVAL_SECONDS, deadline=None,
+                 clock=time.monotonic):
+        self.filepath = filepath
+        self.writer = writer
+        self.interval_seconds = interval_seconds
+        self.deadline = deadline
+        self.clock = clock
+        self.next_url = None
+        self.since_timestamp = 0
+        self.newest_delivery_id = None
+        self.pages = 0
+        self.complete = True
+        self.latest_attempts = {}
+        self._last_saved = clock()
+
+    @classmethod
+    def load(cls, artifacts_path, env, writer, interval_seconds=DEFAULT_CHECKPOINT_INTERVAL_SECONDS, deadline=None):
+        checkpoint = cls(get_checkpoint_filepath(artifacts_path, env), writer, interval_seconds, deadline)
+        try:
+            with open(checkpoint.filepath, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return checkpoint
+        checkpoint.next_url = data.get("next_url")
+        checkpoint.since_timestamp = data.get("since_timestamp", 0)
+        checkpoint.newest_delivery_id = data.get("newest_delivery_id")
+        checkpoint.pages = data.get("pages", 0)
+        checkpoint.complete = data.get("complete", True)
+        latest_attempts = data.get("latest_attempts")
+        if isinstance(latest_attempts, dict):
+            checkpoint.latest_attempts.update(latest_attempts)
+        return checkpoint
+
+    @property
+    def resumable(self):
+        return not self.complete and bool(self.next_url)
+
+    def start(self, since_timestamp):
+        """
+        Starts a new pass over the deliveries from the first page.
+        """
+        self.next_url = None
+        self.since_timestamp = since_timestamp
+        self.newest_delivery_id = None
+        self.pages = 0
+        self.complete = False
+
+    def page_done(self, next_url, deliveries):
+        """
+        Records that every delivery of a listed page was processed; `next_url` is the page to
+        continue from. Saves the checkpoint if the interval elapsed.
+        """
+        self.next_url = next_url
+        self.pages += 1
+        for delivery in deliveries:
+            delivery_id = delivery.get("id")
+            if delivery_id is not None and (self.newest_delivery_id is None or delivery_id > self.newest_delivery_id):
+                self.newest_delivery_id = delivery_id
+        if self.clock() - self._last_saved >= self.interval_seconds:
+            self.save()
+
+    def out_of_time(self):
+        return self.deadline is not None and self.clock() >= self.deadline
+
+    def finish(self):
+        """
+        Saves the final state of the run: complete unless paging stopped before the last page.
+        """
+        self.complete = not self.next_url
+        self.save()
+
+    def save(self):
+        cutoff = time.time() - DELIVERY_RETENTION_SECONDS
+        for guid, (_, delivered_at) in list(self.latest_attempts.items()):
+            if delivered_at is not None and delivered_at < cutoff:
+                del self.latest_attempts[guid]
+        self.writer(self.filepath, json.dumps({
+            "next_url": self.next_url,
+            "since_timestamp": self.since_timestamp,
+            "newest_delivery_id": self.newest_delivery_id,
+            "pages": self.pages,
+            "complete": self.complete,
+            "latest_attempts": dict(sorted(self.latest_attempts.items()))
+        }, indent=4))
+        self._last_saved = self.clock()
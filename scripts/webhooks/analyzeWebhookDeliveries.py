@@ -1,10 +1,28 @@
+import activityLog
+import argparse
 import base64
+import cProfile
 import sys
-import requests
 import os
 import json
 import re
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from activityLog import DEBUG, INFO, WARNING, ERROR, LOG_LEVELS, LOG_FORMATS
+from deliveryCache import DeliveryDetailCache, DEFAULT_CACHE_DIR
+from timedOutStore import TimedOutDeliveryStore
+from githubClient import GitHubClient, GitHubApiError, GITHUB_API_URL
+from gitDataPersistence import commit_files, GitDataPersistenceError
+from incrementalState import IncrementalState, DELIVERY_CURSOR_FILENAME, SEEN_DELIVERIES_FILENAME
+from deliveryRecord import DeliveryRecord, DELIVERY_RETENTION_SECONDS
+from blockedDeliveryReport import BlockedDeliveryReport
+from attemptChains import AttemptChains
+from analysisCheckpoint import AnalysisCheckpoint, atomic_write, CHECKPOINT_FILENAME
+from artifactManifest import ArtifactManifest, git_blob_sha, get_manifest_filepath
+from timeoutRedelivery import TimeoutRedeliverer, DEFAULT_REDELIVERY_RATE, DEFAULT_MAX_REDELIVERY_ATTEMPTS
+from runMetrics import RunMetrics, RUN_METRICS_FILENAME, PROMETHEUS_TEXTFILE_NAME
+from latencyAnalytics import LatencyAnalytics, LATENCY_SKETCHES_FILENAME, LATENCY_REPORT_FILENAME, DEFAULT_REPORT_HOURS
 
 # Map environments to webhook URLs
 WEBHOOK_URLS = {
@@ -16,10 +34,6 @@ WEBHOOK_URLS = {
 
 # GitHub API setup
 GITHUB_TOKEN = os.getenv("GITHUB_TENANT_REPO_AUTH_TOKEN")  # Set this in your environment
-HEADERS = {
-    "Authorization": f"Bearer {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github+json"
-}
 
 ENV_BRANCHES = {
     "dev": "develop",
@@ -30,128 +44,335 @@ ENV_BRANCHES = {
 
 MOST_RECENTLY_PROCESSED_FILENAME = "most_recently_processed"
 TIMED_OUT_DELIVERIES_FILENAME = "timed_out_deliveries"
-BLOCKED_DELIVERY_FILENAME = "blocked_delivery"
+BLOCKED_DELIVERY_FILENAME = "blocked_delivery_report"
 ACTIVITY_LOG_FILENAME = "activity_log"
 MOST_RECENTLY_PROCESSED_FILEPATH = f"{MOST_RECENTLY_PROCESSED_FILENAME}"
 TIMED_OUT_DELIVERIES_FILEPATH = f"{TIMED_OUT_DELIVERIES_FILENAME}"
 BLOCKED_DELIVERY_FILEPATH = f"{BLOCKED_DELIVERY_FILENAME}"
 ACTIVITY_LOG_FILEPATH = f"{ACTIVITY_LOG_FILENAME}"
-GITHUB_DELIVERY_HEADER = "X-Github-Delivery"
-DELIVERY_OBJECT_KEY = "delivery"
-DETAILS_OBJECT_KEY = "details"
 DELIVERY_DETAILS_REQUEST_KEY = "request"
-DELIVERY_DETAILS_RESPONSE_KEY = "response"
-DELIVERY_DETAILS_HEADERS_KEY = "headers"
-DELIVERY_DETAILS_PAYLOAD_KEY = "payload"
 TIMESTAMP_KEY = "timestamp"
-PAYLOAD_HEAD_COMMIT_KEY = "head_commit"
-SIGNATURE_HEADER = "X-Hub-Signature-256"
+PUSH_EVENT = "push"
+DEFAULT_CONCURRENCY = 8
+PERSIST_MODES = ["contents", "batched"]
+ALL_ENVS = "all"
 
 # List of files that are updated during processing that need to be committed
 updated_files = set()
+# Per-phase timings and GitHub API usage of the run
+run_metrics = RunMetrics()
+
+def parse_envs(value):
+    if value == ALL_ENVS:
+      return list(WEBHOOK_URLS.keys())
+    envs = [env.strip() for env in value.split(",") if env.strip()]
+    unknown = [env for env in envs if env not in WEBHOOK_URLS]
+    if not envs or unknown:
+      raise argparse.ArgumentTypeError(f"{', '.join(unknown) or value!r} not in {list(WEBHOOK_URLS.keys())}")
+    # Keep the order of WEBHOOK_URLS and drop duplicates
+    return [env for env in WEBHOOK_URLS if env in envs]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyze Fiserv org webhook deliveries for blocked and timed out requests")
+    parser.add_argument(dest="envs", metavar="env", type=parse_envs,
+                        help=f"Developer Studio environment ({', '.join(WEBHOOK_URLS)}), a comma-separated list of them or '{ALL_ENVS}'")
+    parser.add_argument(dest="artifacts_path", help="Path of artifacts directory")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Number of delivery details fetched in parallel (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Stop paging at the delivery cursor of the previous run and skip already-seen deliveries")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Directory of the local delivery detail cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="Always fetch delivery details from GitHub")
+    parser.add_argument("--persist-mode", choices=PERSIST_MODES, default="contents",
+                        help="contents: one Contents API commit per file; batched: a single Git Data API commit for all files (default: contents)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the checkpoint of a previous run that did not page through all deliveries")
+    parser.add_argument("--max-runtime", type=float, metavar="MINUTES",
+                        help="Stop paging after this many minutes, checkpoint and persist what was analyzed")
+    parser.add_argument("--redeliver-timeouts", action="store_true",
+                        help="Redeliver the timed-out deliveries recorded today and track their outcome")
+    parser.add_argument("--redelivery-rate", type=float, default=DEFAULT_REDELIVERY_RATE,
+                        help=f"Maximum redeliveries per second; halved whenever a redelivery times out again (default: {DEFAULT_REDELIVERY_RATE})")
+    parser.add_argument("--max-redelivery-attempts", type=int, default=DEFAULT_MAX_REDELIVERY_ATTEMPTS,
+                        help=f"Redelivery attempts per timed-out delivery before giving up (default: {DEFAULT_MAX_REDELIVERY_ATTEMPTS})")
+    parser.add_argument("--latency", action="store_true",
+                        help="Also analyze response times, timeout rate and throughput per hour from the deliveries list")
+    parser.add_argument("--latency-report-hours", type=int, default=DEFAULT_REPORT_HOURS,
+                        help=f"Hours covered by the latency report (default: {DEFAULT_REPORT_HOURS})")
+    parser.add_argument("--metrics-textfile",
+                        help=f"Prometheus textfile the run metrics are written to (default: <artifacts_path>/{PROMETHEUS_TEXTFILE_NAME})")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Profile the run with cProfile and dump the stats to FILE; environments are then analyzed one after another")
+    parser.add_argument("--log-level", choices=list(LOG_LEVELS.keys()), default="info",
+                        help="Minimum level of activity log messages; per-delivery details are logged at debug (default: info)")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default="text",
+                        help="Activity log format: plain text lines or JSON lines (default: text)")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+      parser.error("--concurrency must be at least 1")
+    if args.max_runtime is not None and args.max_runtime <= 0:
+      parser.error("--max-runtime must be positive")
+    if args.redelivery_rate <= 0:
+      parser.error("--redelivery-rate must be positive")
+    if args.max_redelivery_attempts < 1:
+      parser.error("--max-redelivery-attempts must be at least 1")
+    if args.latency_report_hours < 1:
+      parser.error("--latency-report-hours must be at least 1")
+    return args
 
 def main():
-    if len(sys.argv) != 3:
-      print("Usage: findBlockedWebhookRequests.py [dev|qa|stage|prod] [path of artifacts directory")
-      sys.exit(1)
+    args = parse_args()
+    if not args.profile:
+      run(args)
+      return
 
-    env = sys.argv[1]
-    if env not in WEBHOOK_URLS:
-      print(f"Error: {env} not in {WEBHOOK_URLS}")
-      print("Usage: findBlockedWebhookRequests.py [dev|qa|stage|prod]")
-      sys.exit(1)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+      run(args)
+    finally:
+      profiler.disable()
+      profiler.dump_stats(args.profile)
+      print(f"cProfile stats written to {args.profile}")
 
-    target_url = WEBHOOK_URLS[env]
+def run(args):
+    envs = args.envs
+    artifacts_path = args.artifacts_path
 
-    artifacts_path = sys.argv[2]
+    activityLog.configure(level=LOG_LEVELS[args.log_level], log_format=args.log_format,
+                          on_seal=updated_files.add)
+    activityLog.install_exit_handlers()
 
     # Validate that the artifacts path exists before proceeding
     if not os.path.isdir(artifacts_path):
       print(f"Error: Artifacts path '{artifacts_path}' does not exist")
       sys.exit(1)
 
-    most_recently_processed_filepath = f"{get_most_recently_processed_filepath(artifacts_path, env)}"
-    timed_out_filepath = f"{get_timed_out_filepath(artifacts_path, env)}"
-    blocked_delivery_filepath = f"{get_blocked_delivery_filepath(artifacts_path, env)}"
-    activity_log_filepath = f"{get_activity_log_filepath(artifacts_path, env)}"
+    deadline = time.monotonic() + args.max_runtime * 60 if args.max_runtime else None
+
+    # One connection pool and rate limit budget shared by all environments
+    client = create_client(args.concurrency * len(envs), deadline)
+
+    detail_cache = None
+    if not args.no_cache:
+      detail_cache = DeliveryDetailCache(args.cache_dir)
+      evicted = detail_cache.evict()
+      print(f"Using delivery detail cache {args.cache_dir} ({evicted} entries evicted)")
 
-    # Step 1: Get all Fiserv org webhooks
-    hooks_url = f"https://api.github.com/orgs/Fiserv/hooks"
-    hooks = requests.get(hooks_url, headers=HEADERS).json()
+    with run_metrics.phase("hook_discovery"):
+      # Resolve the ignored repositories once so deliveries can be filtered before their details are fetched
+      ignored_repository_ids = resolve_ignored_repository_ids(client, get_ignored_repos())
 
-    # Step 2: Find the webhook matching the URL corresponding to the specified environment
-    hook = next((h for h in hooks if h['config'].get('url') == target_url), None)
-    if not hook:
-        update_activity_log(f"No webhook found for URL: {target_url}", activity_log_filepath)
+      # Step 1: Get all Fiserv org webhooks
+      hooks_url = f"{GITHUB_API_URL}/orgs/Fiserv/hooks"
+      try:
+        hooks = [hook for page in client.paginate(hooks_url, params={"per_page": 100}) for hook in page]
+      except GitHubApiError as e:
+        for env in envs:
+          update_activity_log(f"Unable to list webhooks: {e}", get_activity_log_filepath(artifacts_path, env), ERROR)
         sys.exit(1)
 
-    hook_id = hook["id"]
+    # Step 2: Find the webhook matching the URL corresponding to each environment
+    env_hooks = {}
+    for env in envs:
+      target_url = WEBHOOK_URLS[env]
+      hook = next((h for h in hooks if h['config'].get('url') == target_url), None)
+      if not hook:
+        update_activity_log(f"No webhook found for URL: {target_url}", get_activity_log_filepath(artifacts_path, env), ERROR)
+        continue
+      env_hooks[env] = hook
+
+    # Steps 3 and 4 for every environment, concurrently when several were requested
+    analyzed_envs = []
+    if len(env_hooks) == 1:
+      env, hook = next(iter(env_hooks.items()))
+      analyze_environment(env, hook["id"], artifacts_path, client, args, detail_cache, ignored_repository_ids, deadline)
+      analyzed_envs.append(env)
+    elif env_hooks and args.profile:
+      # cProfile only sees the thread it was enabled in, so profiled runs analyze every environment on the main thread
+      for env, hook in env_hooks.items():
+        try:
+          analyze_environment(env, hook["id"], artifacts_path, client, args, detail_cache, ignored_repository_ids, deadline)
+          analyzed_envs.append(env)
+        except Exception as e:
+          update_activity_log(f"Analysis of {env} failed: {e!r}", get_activity_log_filepath(artifacts_path, env), ERROR)
+    elif env_hooks:
+      with ThreadPoolExecutor(max_workers=len(env_hooks)) as executor:
+        futures = {
+          env: executor.submit(analyze_environment, env, hook["id"], artifacts_path, client, args, detail_cache,
+                               ignored_repository_ids, deadline)
+          for env, hook in env_hooks.items()
+        }
+      for env, future in futures.items():
+        try:
+          future.result()
+          analyzed_envs.append(env)
+        except Exception as e:
+          update_activity_log(f"Analysis of {env} failed: {e!r}", get_activity_log_filepath(artifacts_path, env), ERROR)
+
+    # Persist each environment's artifacts separately, exactly as a single-environment run would
+    # Sealing the open activity log segments first makes them part of this run's uploads
+    activityLog.seal_all()
+    manifest = ArtifactManifest.load(get_manifest_filepath(artifacts_path))
+    for env in analyzed_envs:
+      env_files = get_env_files(env)
+      print(f"Files needing to be committed for {env}:")
+      for file in env_files:
+        print(file)
+      with run_metrics.phase("persistence", env):
+        persist_changes(env, client, args.persist_mode, args.concurrency, env_files, manifest)
+
+    # Metrics cover persistence as well, so they are written and uploaded last
+    rate_limit = {key[len("rate_limit_"):]: value for key, value in client.stats().items() if key.startswith("rate_limit_")}
+    for env in analyzed_envs:
+      metrics_filepath = get_run_metrics_filepath(artifacts_path, env)
+      write_and_record(metrics_filepath, run_metrics.to_json(env, rate_limit), mode="w")
+      with run_metrics.phase("persistence", env):
+        persist_changes(env, client, args.persist_mode, args.concurrency, {metrics_filepath}, manifest)
+    metrics_textfile = args.metrics_textfile or os.path.join(artifacts_path, PROMETHEUS_TEXTFILE_NAME)
+    atomic_write(metrics_textfile, run_metrics.to_prometheus(rate_limit))
+    print(f"Run metrics written to {metrics_textfile}")
+    print(f"Artifact manifest: {manifest.summary()}")
+
+    if len(analyzed_envs) != len(envs):
+      sys.exit(1)
+
+def analyze_environment(env, hook_id, artifacts_path, client, args, detail_cache=None, ignored_repository_ids=frozenset(),
+                        deadline=None):
+    """
+    Analyzes the deliveries of one environment's webhook and writes its artifacts.
+    Progress is checkpointed page by page; with `args.resume` an unfinished pass is continued
+    from its checkpoint, and paging stops once the monotonic `deadline` is reached.
+    """
+    with run_metrics.environment(env):
+      _analyze_environment(env, hook_id, artifacts_path, client, args, detail_cache, ignored_repository_ids, deadline)
+
+def _analyze_environment(env, hook_id, artifacts_path, client, args, detail_cache, ignored_repository_ids, deadline):
+    target_url = WEBHOOK_URLS[env]
+    most_recently_processed_filepath = f"{get_most_recently_processed_filepath(artifacts_path, env)}"
+    timed_out_filepath = f"{get_timed_out_filepath(artifacts_path, env)}"
+    blocked_delivery_filepath = f"{get_blocked_delivery_filepath(artifacts_path, env)}"
+    activity_log_filepath = f"{get_activity_log_filepath(artifacts_path, env)}"
 
     update_activity_log(f"Found webhook id for {target_url}: {hook_id}", activity_log_filepath)
 
     # Step 3: Get deliveries for the webhook
-    deliveries_url = f"https://api.github.com/orgs/Fiserv/hooks/{hook_id}/deliveries"
-    deliveries = fetch_all_deliveries(deliveries_url, activity_log_filepath)
+    deliveries_url = f"{GITHUB_API_URL}/orgs/Fiserv/hooks/{hook_id}/deliveries"
+    incremental_state = IncrementalState.load(artifacts_path, env) if args.incremental else None
+    if detail_cache:
+      update_activity_log(f"Using delivery detail cache {detail_cache.cache_dir}", activity_log_filepath)
 
-    # Step 4: Find blocked webhooks
+    most_recently_processed_data = read_most_recently_processed(most_recently_processed_filepath, activity_log_filepath)
+    last_most_recently_processed_timestamp = most_recently_processed_data.get(TIMESTAMP_KEY, 0)
+    try:
+      watermark_timestamp = float(last_most_recently_processed_timestamp)
+    except (TypeError, ValueError):
+      watermark_timestamp = 0.0
+
+    checkpoint = AnalysisCheckpoint.load(artifacts_path, env, lambda filepath, content: write_and_record(filepath, content, mode="w"),
+                                         deadline=deadline)
+    if args.resume and checkpoint.resumable:
+      # The watermark already moved past the unfinished pages, so keep filtering them against the original one
+      last_most_recently_processed_timestamp = checkpoint.since_timestamp
+      if incremental_state and checkpoint.newest_delivery_id is not None:
+        incremental_state.newest_delivery_id = checkpoint.newest_delivery_id
+      update_activity_log(
+          f"Resuming after {checkpoint.pages} pages from {checkpoint.next_url} (timestamp: {last_most_recently_processed_timestamp})",
+          activity_log_filepath)
+    else:
+      if args.resume:
+        update_activity_log("No unfinished run to resume, starting from the newest deliveries", activity_log_filepath)
+      checkpoint.start(last_most_recently_processed_timestamp)
+
+    latency = LatencyAnalytics.load(artifacts_path, env) if args.latency else None
+    # Latest attempts of redelivered deliveries are kept with the checkpoint, so originals listed by later runs are not reclassified
+    attempt_chains = AttemptChains(checkpoint.latest_attempts)
+    deliveries = iter_deliveries(deliveries_url, activity_log_filepath, client, args.concurrency, incremental_state,
+                                 detail_cache, hook_id, ignored_repository_ids, checkpoint, latency, attempt_chains)
+    # Step 4: Find blocked webhooks, classifying each delivery as soon as its details arrive
     num_timed_out = 0
     num_blocked = 0
-    most_recently_processed_delivery = {}
+    most_recently_processed_delivery = None
     num_processed = 0
-    most_recently_processed_data = read_most_recently_processed(most_recently_processed_filepath, activity_log_filepath)
-    last_most_recently_processed_timestamp = most_recently_processed_data.get(TIMESTAMP_KEY, 0)
-
-    update_activity_log(f"Total deliveries to process: {len(deliveries)}", activity_log_filepath)
-    for current_delivery_obj in deliveries:
 
-        current_delivery_detail = current_delivery_obj[DETAILS_OBJECT_KEY]
-        response = current_delivery_detail.get(DELIVERY_DETAILS_RESPONSE_KEY, {})
-
-        headers = current_delivery_detail.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_HEADERS_KEY, {})
-        gitHubDeliveryId = headers.get(GITHUB_DELIVERY_HEADER)
-
-        update_activity_log(f"Processing delivery id: {gitHubDeliveryId}", activity_log_filepath)
+    timed_out_store = TimedOutDeliveryStore.open(timed_out_filepath)
+    blocked_report = BlockedDeliveryReport.open(blocked_delivery_filepath, env, get_today_str(), target_url)
+    num_fetched = 0
+    for record in deliveries:
+      num_fetched += 1
+      with run_metrics.phase("classification"):
+        update_activity_log(f"Processing delivery id: {record.guid}", activity_log_filepath, DEBUG)
 
         # Determine if the delivery is newer than the last-most-recently-processed delivery
-        if not delivery_needs_processing(last_most_recently_processed_timestamp, current_delivery_obj, env, activity_log_filepath):
+        if not delivery_needs_processing(last_most_recently_processed_timestamp, record, env, activity_log_filepath):
             continue
 
         # Check for deliveries that timed out (empty response)
-        if ((response.get(DELIVERY_DETAILS_HEADERS_KEY, {}) == {} or response.get(DELIVERY_DETAILS_HEADERS_KEY, {}) == None)
-            and response.get(DELIVERY_DETAILS_PAYLOAD_KEY, "") == ""):
-            if handle_timeout_delivery(current_delivery_obj, timed_out_filepath, activity_log_filepath):
+        if record.timed_out:
+            if handle_timeout_delivery(record, timed_out_store, activity_log_filepath):
                 num_timed_out += 1
             continue
 
-        if handle_blocked_delivery(current_delivery_obj, blocked_delivery_filepath, target_url, activity_log_filepath):
+        if handle_blocked_delivery(record, blocked_report, activity_log_filepath):
             num_blocked += 1
 
-        if not most_recently_processed_delivery or get_delivery_timestamp(current_delivery_detail, activity_log_filepath) > most_recently_processed_delivery[TIMESTAMP_KEY]:
-            most_recently_processed_delivery = current_delivery_obj
+        if record.timestamp > watermark_timestamp:
+            most_recently_processed_delivery = record
+            watermark_timestamp = record.timestamp
             update_most_recently_processed(most_recently_processed_filepath, most_recently_processed_delivery, activity_log_filepath)
 
         num_processed += 1
-        update_activity_log(f"Processed {num_processed} deliveries so far...", activity_log_filepath)
+        update_activity_log(f"Processed {num_processed} deliveries so far...", activity_log_filepath, DEBUG)
+
+    record_attempt_chains(attempt_chains, timed_out_store, blocked_report, activity_log_filepath)
+
+    if args.redeliver_timeouts:
+      with run_metrics.phase("redelivery"):
+        redeliver_timeouts(client, deliveries_url, timed_out_store, artifacts_path, env, activity_log_filepath, args, deadline)
+
+    timed_out_store.export(lambda filepath, content: write_and_record(filepath, content, mode="w"))
+    blocked_report.export(lambda filepath, content: write_and_record(filepath, content, mode="w"))
+    if latency:
+      save_latency_analytics(latency, artifacts_path, env, args.latency_report_hours, activity_log_filepath)
+    checkpoint.finish()
+
+    if detail_cache:
+      update_activity_log(f"Delivery detail cache stats: {detail_cache.stats()}", activity_log_filepath)
 
+    update_activity_log(f"Total deliveries fetched: {num_fetched}", activity_log_filepath)
     update_activity_log(f"Total number of deliveries needing to be processed: {num_processed}", activity_log_filepath)
     update_activity_log(f"Total number of blocked webhooks: {num_blocked}", activity_log_filepath)
     update_activity_log(f"Total number of timed_out webhooks: {num_timed_out}", activity_log_filepath)
 
-    if num_processed > 0:
-      current_delivery_detail = most_recently_processed_delivery[DETAILS_OBJECT_KEY]
-      headers = current_delivery_detail.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_HEADERS_KEY, {})
-      gitHubDeliveryId = headers.get(GITHUB_DELIVERY_HEADER)
-      timestamp = most_recently_processed_delivery[TIMESTAMP_KEY]
-      delivery_date = printable_date_time(current_delivery_detail, activity_log_filepath)
+    if most_recently_processed_delivery is not None:
+      record = most_recently_processed_delivery
       update_activity_log(
-          f"Most recent processed delivery -- id: {gitHubDeliveryId}, timestamp: {delivery_date}, timestamp: {timestamp}",
+          f"Most recent processed delivery -- id: {record.guid}, timestamp: {record.local_datetime}, timestamp: {record.timestamp}",
           activity_log_filepath)
 
-    print("Files needing to be committed:")
-    for file in updated_files:
-      print(file)
+    if incremental_state:
+      update_activity_log(
+          f"Incremental run skipped {incremental_state.skipped} already-processed deliveries",
+          activity_log_filepath)
+      # The cursor may only move past deliveries once every older page was analyzed as well
+      incremental_state.save(lambda filepath, content: write_and_record(filepath, content, mode="w"),
+                             advance_cursor=checkpoint.complete)
+
+    if not checkpoint.complete:
+      update_activity_log(
+          f"Stopped after {checkpoint.pages} pages with deliveries left to analyze; run again with --resume to continue",
+          activity_log_filepath, WARNING)
+
+    update_activity_log(f"GitHub API usage: {client.stats()}", activity_log_filepath)
 
-    persist_changes(env)
+def create_client(pool_size=DEFAULT_CONCURRENCY, deadline=None):
+    """
+    Returns a GitHubClient whose connection pool is sized so that every fetch worker
+    can hold its own keep-alive connection. Rate limit waits do not extend past `deadline`.
+    """
+    return GitHubClient(GITHUB_TOKEN, GITHUB_API_URL, pool_size=pool_size, on_response=run_metrics.observe_response,
+                        deadline=deadline)
 
 def get_today_str():
   return datetime.now().strftime("%m-%d-%Y")
@@ -159,47 +380,87 @@ def get_today_str():
 def get_most_recently_processed_filepath(artifacts_path, env):
   return f"{artifacts_path}/{MOST_RECENTLY_PROCESSED_FILEPATH}_{env}.json"
 
-def get_timed_out_filepath(artifacts_path, env):
-  return f"{artifacts_path}/{TIMED_OUT_DELIVERIES_FILEPATH}_{get_today_str()}_{env}.json"
+def get_timed_out_filepath(artifacts_path, env, date_str=None):
+  return f"{artifacts_path}/{TIMED_OUT_DELIVERIES_FILEPATH}_{date_str or get_today_str()}_{env}.json"
+
+def get_blocked_delivery_filepath(artifacts_path, env):
+  return f"{artifacts_path}/{BLOCKED_DELIVERY_FILEPATH}_{get_today_str()}_{env}.json"
 
-# get_blocked_delivery_filepath doesn't include the extension because
-# the GitHub DeliveryId is appended to this path to form the complete filename
-def get_blocked_delivery_filepath (artifacts_path, env):
-  return f"{artifacts_path}/{BLOCKED_DELIVERY_FILEPATH}_{get_today_str()}_{env}"
+def get_run_metrics_filepath(artifacts_path, env):
+  return f"{artifacts_path}/{RUN_METRICS_FILENAME}_{get_today_str()}_{env}.json"
+
+def get_latency_report_filepath(artifacts_path, env):
+  return f"{artifacts_path}/{LATENCY_REPORT_FILENAME}_{get_today_str()}_{env}.json"
 
 def get_activity_log_filepath(artifacts_path, env):
    return f"{artifacts_path}/{ACTIVITY_LOG_FILEPATH}_{get_today_str()}_{env}.log"
 
-def persist_changes(env):
+def get_env_files(env):
+  # Every artifact name carries the environment as a "_<env>" suffix or "_<env>_" infix
+  env_pattern = re.compile(rf"_{re.escape(env)}(_|\.)")
+  return {file for file in updated_files if env_pattern.search(os.path.basename(file))}
+
+def persist_changes(env, client=None, mode="contents", concurrency=DEFAULT_CONCURRENCY, files=None, manifest=None):
     # Commit new and/or updated persistence files to the appropriate branch
+    # With a manifest, files identical to what was last persisted are skipped and known shas are not looked up
     repo_owner = "Fiserv"
     repo_name = "developer-studio-webhook-artifacts"
     repo_path_name = "artifacts"
     branch_name = "main" # Always commit to 'main' branch
-    api_base_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents"
+    repo_api_url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}"
+    api_base_url = f"{repo_api_url}/contents"
     commit_messages = {
       f"{ACTIVITY_LOG_FILEPATH}": f"Most recent activity log for {env} environment",
       f"{MOST_RECENTLY_PROCESSED_FILEPATH}": f"Most recently processed data for {env} environment",
-      f"{BLOCKED_DELIVERY_FILEPATH}": f"Blocked webhook for {env} environment",
-      f"{TIMED_OUT_DELIVERIES_FILEPATH}": f"Timed out webhooks for {env} environment"
+      f"{BLOCKED_DELIVERY_FILEPATH}": f"Blocked webhooks for {env} environment",
+      f"{TIMED_OUT_DELIVERIES_FILEPATH}": f"Timed out webhooks for {env} environment",
+      f"{DELIVERY_CURSOR_FILENAME}": f"Delivery cursor for {env} environment",
+      f"{SEEN_DELIVERIES_FILENAME}": f"Seen deliveries for {env} environment",
+      f"{CHECKPOINT_FILENAME}": f"Analysis checkpoint for {env} environment",
+      f"{RUN_METRICS_FILENAME}": f"Run metrics for {env} environment",
+      f"{LATENCY_SKETCHES_FILENAME}": f"Latency sketches for {env} environment",
+      f"{LATENCY_REPORT_FILENAME}": f"Latency report for {env} environment"
     }
 
-    for file in updated_files:
+    # Only sealed activity log segments are uploaded; seal the open ones so everything logged so far is included
+    activityLog.seal_all()
+
+    if client is None:
+        client = create_client(concurrency)
+
+    if files is None:
+        files = updated_files
+
+    if mode == "batched":
+        persist_changes_batched(env, client, files, repo_api_url, branch_name, repo_path_name, concurrency, manifest)
+        if manifest:
+            manifest.save()
+        return
+
+    for file in files:
         # Read file content
         with open(file, "rb") as f:
             content_bytes = f.read()
-        content_b64 = base64.b64encode(content_bytes).decode("utf-8")
 
         # Construct the relative path of the file in the repo
         repo_file_path = repo_path_name + "/" + os.path.basename(file)
 
-        # Check if file exists to get its sha
+        if manifest and manifest.unchanged(repo_file_path, content_bytes):
+            print(f"{repo_file_path} is unchanged, skipping")
+            continue
+        content_b64 = base64.b64encode(content_bytes).decode("utf-8")
+
+        # Check if file exists to get its sha, unless the manifest knows it
         get_url = f"{api_base_url}/{repo_file_path}?ref={branch_name}"
-        response = requests.get(get_url, headers=HEADERS)
-        if response.status_code == 200:
-            sha = response.json().get("sha")
-        else:
-            sha = None
+        sha = manifest.get(repo_file_path) if manifest else None
+        sha_from_manifest = bool(sha)
+        if not sha:
+            sha = get_remote_sha(client, get_url)
+            if manifest and sha == git_blob_sha(content_bytes):
+                manifest.record(repo_file_path, sha)
+                manifest.unchanged(repo_file_path, content_bytes)
+                print(f"{repo_file_path} is unchanged, skipping")
+                continue
 
         commit_message = None
         for prefix, message in commit_messages.items():
@@ -221,188 +482,315 @@ def persist_changes(env):
         if sha:
             payload["sha"] = sha
 
-        put_response = requests.put(put_url, headers=HEADERS, json=payload)
+        put_response = client.put(put_url, json=payload)
+        if put_response.status_code in (409, 422) and sha_from_manifest:
+            # The file was changed outside this job; retry with its current sha
+            sha_from_manifest = False
+            sha = get_remote_sha(client, get_url)
+            payload.pop("sha", None)
+            if sha:
+                payload["sha"] = sha
+            put_response = client.put(put_url, json=payload)
         if put_response.status_code in (200, 201):
             print(f"Committed {repo_file_path} to branch {branch_name}")
+            if manifest:
+                manifest.lookups_avoided += sha_from_manifest
+                manifest.record(repo_file_path, put_response.json().get("content", {}).get("sha") or git_blob_sha(content_bytes))
         else:
             print(f"Failed to commit {repo_file_path}: {put_response.status_code} {put_response.text}")
 
-def update_activity_log(log_content, activity_log_filepath):
-    print(f"{log_content}")
-    write_and_record(activity_log_filepath, log_content + "\n", mode="a")
+    if manifest:
+        manifest.save()
 
-def handle_blocked_delivery(current_delivery_obj, blocked_delivery_filepath, target_url, activity_log_filepath):
-    details = current_delivery_obj[DETAILS_OBJECT_KEY]
-    headers = details.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_HEADERS_KEY, {})
-    delivery_id = headers.get(GITHUB_DELIVERY_HEADER)
+def get_remote_sha(client, get_url):
+    response = client.get(get_url)
+    if response.status_code == 200:
+        return response.json().get("sha")
+    return None
 
-    statusCode = details.get("status_code")
-    if statusCode == 200:
-      save_blocked_delivery(blocked_delivery_filepath, target_url, delivery_id, details, activity_log_filepath)
+def persist_changes_batched(env, client, files, repo_api_url, branch_name, repo_path_name, concurrency=DEFAULT_CONCURRENCY,
+                            manifest=None):
+    """
+    Commits all updated files in one commit through the Git Data API instead of one Contents API
+    commit per file. With a manifest, files identical to what was last persisted are left out.
+    """
+    blob_shas = {}
+    if manifest:
+        changed_files = []
+        for file in files:
+            with open(file, "rb") as f:
+                content_bytes = f.read()
+            repo_file_path = f"{repo_path_name}/{os.path.basename(file)}"
+            if not manifest.unchanged(repo_file_path, content_bytes):
+                changed_files.append(file)
+                blob_shas[repo_file_path] = git_blob_sha(content_bytes)
+        files = changed_files
+
+    if not files:
+        print("No files to commit")
+        return
+
+    files = sorted(files)
+    commit_message = f"Webhook analysis artifacts for {env} environment\n\n" + "\n".join(
+        os.path.basename(file) for file in files)
+    try:
+        commit_sha = commit_files(client, repo_api_url, files, commit_message, branch_name, repo_path_name, concurrency)
+    except GitDataPersistenceError as e:
+        print(f"Failed to commit {len(files)} files: {e}")
+        return
+    print(f"Committed {len(files)} files to branch {branch_name} in commit {commit_sha}")
+    if manifest:
+        for repo_file_path, blob_sha in blob_shas.items():
+            manifest.record(repo_file_path, blob_sha)
+
+def update_activity_log(log_content, activity_log_filepath, level=INFO):
+    activityLog.get_activity_log(activity_log_filepath).log(log_content, level)
+
+def handle_blocked_delivery(record, blocked_report, activity_log_filepath):
+    if record.status_code == 200:
+      save_blocked_delivery(blocked_report, record, activity_log_filepath)
       return True
 
-def save_blocked_delivery(blocked_delivery_filepath, target_url, gitHubDeliveryId, current_delivery_detail, activity_log_filepath):
-    persistence_filename = f"{blocked_delivery_filepath}_{gitHubDeliveryId}.log"
-    responsePayload = current_delivery_detail.get(DELIVERY_DETAILS_RESPONSE_KEY, {}).get(DELIVERY_DETAILS_PAYLOAD_KEY, {})
-    requestPayload = current_delivery_detail.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_PAYLOAD_KEY, {})
-    transid = re.search(r"_event_transid='([^']+)'", responsePayload)
-    clientip = re.search(r"_event_clientip='([^']+)'", responsePayload)
-    clientport = re.search(r"_event_clientport='([^']+)'", responsePayload)
-    log_lines = [
-        "************** Blocked webhook request **************",
-        f"webhook: {target_url}",
-        f"GitHub delivery Id: {gitHubDeliveryId}",
-        "Timestamp: " + str(get_delivery_timestamp(current_delivery_detail, activity_log_filepath)),
-        f"transid: {transid.group(1) if transid else None}",
-        f"clientip: {clientip.group(1) if clientip else None}",
-        f"clientport: {clientport.group(1) if clientport else None}",
-        "request payload: " + json.dumps(requestPayload, indent=4),
-        "*****************************************************"
-    ]
-    # Log to stdout and file
-    write_and_record(persistence_filename, "\n".join(log_lines) + "\n", mode="w")
-
-def handle_timeout_delivery(delivery, timed_out_filepath, activity_log_filepath):
+def save_blocked_delivery(blocked_report, record, activity_log_filepath):
+    # The WAF fields were extracted from the response payload when the record was built
+    if blocked_report.add(record):
+      update_activity_log(
+          f"Delivery {record.guid} was blocked (transid: {record.transid}, clientip: {record.clientip}). "
+          f"Updating {blocked_report.filepath}", activity_log_filepath)
+
+def record_attempt_chains(attempt_chains, timed_out_store, blocked_report, activity_log_filepath):
+    """
+    Records the attempt count, first attempt time and time to success of the deliveries stored
+    in the timed-out store and the blocked report, and logs the final outcomes of the run.
+    A delivery's fields are only updated when the run listed at least as many of its attempts.
     """
-    Records a timed-out webhook delivery in a JSON file, ensuring each delivery is only recorded once.
-
-    This function uses a read-modify-write pattern to maintain the file as a valid JSON array of delivery records.
-    It first reads the existing file (if present), loads the list of records, and checks for duplicates.
-    If the delivery is not already present, it appends the new record and writes the updated list back to the file.
-    This approach ensures the file remains a valid JSON array, avoids duplicate entries, and allows for reliable
-    reading and updating of the data in future runs. Appending directly to the file would break the JSON structure
-    and make it unreadable as a JSON array.
+    for store in (timed_out_store, blocked_report):
+      for guid, record in list(store.entries.items()):
+        chain = attempt_chains.get(guid)
+        if chain is None or chain.attempts < record.get("attempts", 0):
+          continue
+        fields = chain.to_fields()
+        if any(record.get(key) != value for key, value in fields.items()):
+          store.update(guid, fields)
+    update_activity_log(f"Delivery attempt chains: {json.dumps(attempt_chains.summary())}", activity_log_filepath)
+
+def handle_timeout_delivery(record, timed_out_store, activity_log_filepath):
+    """
+    Records a timed-out webhook delivery in the run's TimedOutDeliveryStore, ensuring each delivery is only recorded once.
+
+    The store keeps every record of the timed-out deliveries file in memory, indexed by delivery id, so duplicates
+    are detected with a single lookup. New records are journaled as they arrive and the file is rewritten as a
+    valid JSON array only once, when the store is exported at the end of the run.
     """
-    details = delivery[DETAILS_OBJECT_KEY]
-    headers = details.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_HEADERS_KEY, {})
-    delivery_id = headers.get(GITHUB_DELIVERY_HEADER)
-    payload = details.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_PAYLOAD_KEY, {})
-    timestamp = get_delivery_timestamp(details, activity_log_filepath)
-
-    update_activity_log(f"Delivery {delivery_id} timed out. Updating {timed_out_filepath}", activity_log_filepath)
-
-    record = {
-      "delivery_id": delivery_id,
-      "payload": payload,
-      "timestamp": timestamp
+    update_activity_log(f"Delivery {record.guid} timed out. Updating {timed_out_store.filepath}", activity_log_filepath)
+
+    timed_out_record = {
+      "delivery_id": record.guid,
+      "payload": record.request_payload,
+      "timestamp": record.timestamp,
+      # The id of the delivery in the hook's deliveries list, needed to redeliver it
+      "hook_delivery_id": record.delivery_id
     }
 
-    try:
-      with open(timed_out_filepath, "r") as f:
-        data = json.load(f)
-        if not isinstance(data, list):
-          data = []
-    except (FileNotFoundError, json.JSONDecodeError):
-      data = []
-
-    # Only append if delivery_id is not already present
-    if not any(r.get("delivery_id") == delivery_id for r in data):
-      data.append(record)
-      write_and_record(timed_out_filepath, json.dumps(data, indent=4), mode="w")
-    else:
-      update_activity_log(f"Delivery {delivery_id} already present in {timed_out_filepath}, skipping.", activity_log_filepath)
+    if not timed_out_store.add(timed_out_record):
+      update_activity_log(f"Delivery {record.guid} already present in {timed_out_store.filepath}, skipping.", activity_log_filepath, DEBUG)
 
     return True
 
+def redeliver_timeouts(client, deliveries_url, timed_out_store, artifacts_path, env, activity_log_filepath, args,
+                       deadline=None):
+    """
+    Redelivers the timed-out deliveries that have not been recovered yet, paced so the endpoint
+    that timed out is not overloaded again, and records the outcomes in the stores. Besides
+    today's store, the stores of the earlier days GitHub still keeps deliveries for are loaded,
+    and written back if their records changed. Nothing is redelivered past the monotonic `deadline`.
+    """
+    today = datetime.now()
+    earlier_stores = []
+    for days_ago in range(1, timedelta(seconds=DELIVERY_RETENTION_SECONDS).days + 1):
+      filepath = get_timed_out_filepath(artifacts_path, env, (today - timedelta(days=days_ago)).strftime("%m-%d-%Y"))
+      if os.path.exists(filepath):
+        earlier_stores.append(TimedOutDeliveryStore.open(filepath))
+    redeliverer = TimeoutRedeliverer(
+        client, deliveries_url, [timed_out_store] + earlier_stores,
+        lambda message, level=INFO: update_activity_log(message, activity_log_filepath, level),
+        rate=args.redelivery_rate, max_attempts=args.max_redelivery_attempts)
+    summary = redeliverer.run(deadline=deadline)
+    for store in earlier_stores:
+      store.export(lambda filepath, content: write_and_record(filepath, content, mode="w"))
+    update_activity_log(f"Timed-out delivery redelivery summary: {json.dumps(summary)}", activity_log_filepath)
+    return summary
+
+def save_latency_analytics(latency, artifacts_path, env, report_hours, activity_log_filepath):
+    """
+    Saves the merged hourly latency sketches and writes the day's latency report from them.
+    """
+    latency.finish()
+    write_and_record(latency.filepath, latency.to_json(), mode="w")
+    report = latency.report(report_hours)
+    write_and_record(get_latency_report_filepath(artifacts_path, env), json.dumps(report, indent=4), mode="w")
+    total = report["total"]
+    update_activity_log(
+        f"Latency: folded {latency.observed} deliveries ({latency.skipped} already folded); last {report_hours}h: "
+        f"p50 {total['p50_seconds']}s, p95 {total['p95_seconds']}s, p99 {total['p99_seconds']}s, "
+        f"timeout rate {total['timeout_rate']}, {total['throughput_per_minute']} deliveries/min", activity_log_filepath)
+
 def write_and_record(file_path, content, mode="w"):
-    with open(file_path, mode) as f:
-        f.write(content)
+    if mode == "w":
+        # Artifacts are replaced atomically so an interrupted run never leaves a truncated file behind
+        atomic_write(file_path, content)
+    else:
+        with open(file_path, mode) as f:
+            f.write(content)
     updated_files.add(file_path)
 
-def fetch_all_deliveries(deliveries_url, activity_log_filepath):
+def fetch_delivery_details(client, deliveries_url, delivery, detail_cache=None, hook_id=None):
+  delivery_id = delivery.get("id")
+  if detail_cache:
+    details = detail_cache.get(hook_id, delivery_id)
+    if details is not None:
+      return details
+
+  detail_url = f"{deliveries_url}/{delivery_id}"
+  response = client.get(detail_url)
+  if not response.ok:
+    print(f"Unable to fetch details of delivery {delivery_id}: {response.status_code}")
+    return {}
+  details = response.json()
+  # Only complete detail documents are immutable; error bodies must not be cached
+  if detail_cache and DELIVERY_DETAILS_REQUEST_KEY in details:
+    detail_cache.put(hook_id, delivery_id, details)
+  return details
+
+def delivery_is_candidate(delivery, ignored_repository_ids=frozenset()):
+  """
+  Decides from the fields of a deliveries list entry alone whether its details are worth fetching.
+  Only push deliveries carry a head_commit, and deliveries of ignored repositories are never analyzed.
+  Entries lacking a field are kept; the checks on their details still apply.
+  """
+  event = delivery.get("event")
+  if event is not None and event != PUSH_EVENT:
+    return False
+  return delivery.get("repository_id") not in ignored_repository_ids
+
+def iter_deliveries(deliveries_url, activity_log_filepath, client=None, concurrency=DEFAULT_CONCURRENCY,
+                    incremental_state=None, detail_cache=None, hook_id=None, ignored_repository_ids=frozenset(),
+                    checkpoint=None, latency=None, attempt_chains=None):
+  """
+  Pages through the deliveries of a webhook, fetches the details of each delivery and yields
+  a DeliveryRecord for each delivery with a valid head_commit, one at a time, newest first.
+  Each detail document is parsed once into its record and not referenced afterwards.
+  Only one page of deliveries is held in memory: the next page is requested once the consumer
+  has processed the current one.
+  Details for a page are fetched by a pool of `concurrency` workers sharing one pooled client;
+  results are consumed in list order, so the deliveries keep the API ordering.
+  With an `incremental_state`, already-processed deliveries are not fetched and paging stops
+  at the page containing the cursor of the previous run. With a `detail_cache`, details of
+  `hook_id` are looked up locally before any network call.
+  List entries that are not candidates (see delivery_is_candidate) are dropped before their
+  details are fetched.
+  With a `checkpoint`, paging starts from its next page if it has one, every page is
+  reported to it once all its deliveries were consumed, and paging stops when it runs out of time.
+  With `latency` (LatencyAnalytics), every listed delivery is folded into its hourly sketches.
+  Redelivery attempts are grouped by guid in `attempt_chains` (AttemptChains) and only the
+  latest attempt of each delivery is fetched and yielded.
+  """
   per_page = 100  # Max is 100
   next_url = deliveries_url + f"?per_page={per_page}"
-  all_deliveries_with_details = []
-
-  while next_url:
-      response = requests.get(next_url, headers=HEADERS)
-      deliveries = response.json()
-      deliveries_with_details = []
-      for delivery in deliveries:
-        delivery_id = delivery.get("id")
-        detail_url = f"{deliveries_url}/{delivery_id}"
-        details = requests.get(detail_url, headers=HEADERS).json()
-        headers = details.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_HEADERS_KEY, {})
-        gitHubDeliveryId = headers.get(GITHUB_DELIVERY_HEADER)
-        signature =  headers.get(SIGNATURE_HEADER)
-        payload = details.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_PAYLOAD_KEY, {})
-        head_commit = payload.get(PAYLOAD_HEAD_COMMIT_KEY, {})
-        if head_commit:
-          epoch_timestamp = get_delivery_timestamp(details, activity_log_filepath)
-          if epoch_timestamp == None:
-            update_activity_log(f"Skipping delivery id {gitHubDeliveryId} with invalid timestamp: ", activity_log_filepath)
-            continue
-
+  if checkpoint and checkpoint.next_url:
+    next_url = checkpoint.next_url
+  total_deliveries = 0
+  total_filtered = 0
+  if client is None:
+    client = create_client(concurrency)
+  if attempt_chains is None:
+    attempt_chains = AttemptChains()
+
+  # Fetch workers attribute their requests to the environment of the consuming thread
+  env = run_metrics.current_env()
+
+  def fetch_details(delivery):
+    with run_metrics.phase("detail_fetch", env):
+      return fetch_delivery_details(client, deliveries_url, delivery, detail_cache, hook_id)
+
+  with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    while next_url:
+      # List pages are fetched conditionally so pages that did not change cost a 304
+      with run_metrics.phase("list_pagination"):
+        response = client.get(next_url, conditional=True)
+      if not response.ok:
+        raise GitHubApiError(f"Unable to list deliveries: {response.status_code} {response.text[:200]}", response)
+      listed_deliveries = response.json()
+      if latency:
+        latency.observe_page(listed_deliveries)
+      # Older attempts of a delivery are listed after its latest one and are only counted
+      deliveries = attempt_chains.latest_attempts(listed_deliveries)
+      num_page_deliveries = 0
+      reached_cursor = False
+      if incremental_state:
+        reached_cursor = any(incremental_state.reached_cursor(d) for d in deliveries)
+        deliveries = [d for d in deliveries if incremental_state.needs_details(d)]
+        for delivery in listed_deliveries:
+          incremental_state.observe(delivery)
+      candidates = [d for d in deliveries if delivery_is_candidate(d, ignored_repository_ids)]
+      if incremental_state:
+        for delivery in deliveries:
+          if not delivery_is_candidate(delivery, ignored_repository_ids):
+            incremental_state.mark_seen(delivery)
+      num_filtered = len(deliveries) - len(candidates)
+      total_filtered += num_filtered
+      deliveries = candidates
+      update_activity_log(f"Filtered out {num_filtered} deliveries using list fields", activity_log_filepath, DEBUG)
+      all_details = executor.map(fetch_details, deliveries)
+      for delivery, details in zip(deliveries, all_details):
+        if not details:
+          # The details could not be fetched; the delivery is left for a later run
+          if incremental_state:
+            incremental_state.mark_failed(delivery)
+          continue
+        # The detail document is only walked here; everything below reads the record
+        record = DeliveryRecord.from_details(delivery, details)
+        del details
+        if not record.has_head_commit:
+          update_activity_log(f"Skipping delivery {record.guid} with no head_commit", activity_log_filepath, DEBUG)
+        elif record.timestamp is None:
           update_activity_log(
-              f"Found head_commit for delivery id {gitHubDeliveryId}, timestamp: {epoch_timestamp}, {datetime.fromtimestamp(epoch_timestamp)}",
-              activity_log_filepath)
-          update_activity_log(f"signature: {signature}, delivery id: {gitHubDeliveryId}", activity_log_filepath)
-          deliveries_with_details.append({
-            DELIVERY_OBJECT_KEY: delivery,
-            DETAILS_OBJECT_KEY: details,
-            TIMESTAMP_KEY: epoch_timestamp
-          })
+              f"Skipping delivery id {record.guid} with invalid timestamp: {record.head_commit_timestamp}",
+              activity_log_filepath, WARNING)
         else:
-          update_activity_log(f"Skipping delivery {gitHubDeliveryId} with no head_commit", activity_log_filepath)
-
-      update_activity_log(f"Adding {len(deliveries_with_details)} deliveries", activity_log_filepath)
-      all_deliveries_with_details.extend(deliveries_with_details)
-      update_activity_log(f"Total deliveries so far: {len(all_deliveries_with_details)}", activity_log_filepath)
+          update_activity_log(
+              f"Found head_commit for delivery id {record.guid}, timestamp: {record.timestamp}, {record.local_datetime}",
+              activity_log_filepath, DEBUG)
+          update_activity_log(f"signature: {record.signature}, delivery id: {record.guid}", activity_log_filepath, DEBUG)
+          num_page_deliveries += 1
+          yield record
+        if incremental_state:
+          incremental_state.mark_seen(delivery)
+
+      update_activity_log(f"Added {num_page_deliveries} deliveries", activity_log_filepath)
+      total_deliveries += num_page_deliveries
+      update_activity_log(f"Total deliveries so far: {total_deliveries}", activity_log_filepath)
 
       # Get the URL for the next page of deliveries
       link_header = response.headers.get("Link", "")
       next_url = None
-      if 'rel="next"' in link_header:
+      if reached_cursor:
+          update_activity_log("Reached deliveries processed by the previous run, stopping", activity_log_filepath)
+      elif 'rel="next"' in link_header:
           parts = link_header.split(",")
           for part in parts:
               if 'rel="next"' in part:
                   next_url = part.split(";")[0].strip().strip("<>")
                   break
 
-  return all_deliveries_with_details
+      if checkpoint:
+        checkpoint.page_done(next_url, listed_deliveries)
+        if next_url and checkpoint.out_of_time():
+          update_activity_log("Out of time, stopping before the next page of deliveries", activity_log_filepath, WARNING)
+          break
 
-"""
-get_delivery_timestamp takes a delivery detail object and extracts the timestamp from the head_commit.
-The timestamp from the head_commit is the timestamp of the most recent commit in the push that triggered the webhook.
-It is not the timestamp of the delivery itself -- this is not available in the GitHub API or the webhook payload.
-"""
-def get_delivery_timestamp(detail, activity_log_filepath):
-    """
-    Extracts and parses the timestamp from a delivery object.
-    Returns the local time epoch timestamp (float) or None if not found/invalid.
-    Also prints the normalized local datetime for clarity.
-    """
-    requestPayload = detail.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_PAYLOAD_KEY, {})
-    head_commit = requestPayload.get(PAYLOAD_HEAD_COMMIT_KEY, {})
-    if not head_commit:
-        update_activity_log("No head_commit found in delivery", activity_log_filepath)
-        return None
-    timestamp = head_commit.get(TIMESTAMP_KEY)
-    print(f"timestamp from head_commit {timestamp}")
-
-    if not timestamp:
-        update_activity_log("No timestamp found in delivery", activity_log_filepath)
-        return None
-    try:
-        # Parse ISO 8601 timestamp to aware datetime
-        dt = datetime.fromisoformat(timestamp)
-
-        # Normalize to local time
-        local_dt = dt.astimezone()
-        epoch_timestamp = local_dt.timestamp()
-        return epoch_timestamp
-    except Exception:
-        update_activity_log(f"Invalid timestamp format: {timestamp}, delivery should be skipped", activity_log_filepath)
-        return None
-
-def printable_date_time(detail, activity_log_filepath):
-    """
-    Returns a local datetime object for the delivery detail's head_commit timestamp.
-    """
-    epoch_timestamp = get_delivery_timestamp(detail, activity_log_filepath)
-    if epoch_timestamp is None:
-        return None
-    return datetime.fromtimestamp(epoch_timestamp)
+  update_activity_log(
+      f"Skipped the details of {total_filtered} non-push or ignored-repository deliveries", activity_log_filepath)
 
 def read_most_recently_processed(most_recently_processed_filepath, activity_log_filepath):
   try:
@@ -417,22 +805,19 @@ def read_most_recently_processed(most_recently_processed_filepath, activity_log_
     update_activity_log(f"File not found: {most_recently_processed_filepath}", activity_log_filepath)
     return {"delivery_id": None, "timestamp": 0}
   except json.JSONDecodeError:
-    update_activity_log(f"Invalid JSON in file: {most_recently_processed_filepath}", activity_log_filepath)
+    update_activity_log(f"Invalid JSON in file: {most_recently_processed_filepath}", activity_log_filepath, WARNING)
     return {"delivery_id": None, "timestamp": 0}
   except Exception as e:
-   update_activity_log(f"Error reading {most_recently_processed_filepath}: {e}", activity_log_filepath)
+   update_activity_log(f"Error reading {most_recently_processed_filepath}: {e}", activity_log_filepath, ERROR)
    return {"delivery_id": None, "timestamp": 0}
 
-def update_most_recently_processed(most_recently_processed_filepath, most_recently_processed_delivery, activity_log_filepath):
-  detail = most_recently_processed_delivery[DETAILS_OBJECT_KEY]
-  headers = detail.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_HEADERS_KEY, {})
-  gitHubDeliveryId = headers.get(GITHUB_DELIVERY_HEADER)
-  timestamp = most_recently_processed_delivery[TIMESTAMP_KEY]
-  delivery_date = printable_date_time(detail, activity_log_filepath)
-  delivery_date_str = delivery_date.isoformat() if delivery_date else None
+def update_most_recently_processed(most_recently_processed_filepath, record, activity_log_filepath):
+  gitHubDeliveryId = record.guid
+  timestamp = record.timestamp
+  delivery_date_str = record.local_datetime.isoformat()
   update_activity_log(
       f"Most recent processed delivery set to -- id: {gitHubDeliveryId}, date-time: {delivery_date_str}, timestamp: {timestamp}",
-      activity_log_filepath)
+      activity_log_filepath, DEBUG)
 
   write_and_record(
       most_recently_processed_filepath,
@@ -444,22 +829,19 @@ def update_most_recently_processed(most_recently_processed_filepath, most_recent
           }, indent=4),
       mode="w")
 
-def delivery_needs_processing(most_recently_processed_timestamp, delivery, env, activity_log_filepath):
-  details = delivery[DETAILS_OBJECT_KEY]
-  headers = details.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_HEADERS_KEY, {})
-  id = headers.get(GITHUB_DELIVERY_HEADER)
-  payload = details.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_PAYLOAD_KEY, {})
-  branch = payload.get('ref', '').replace('refs/heads/', '')
-  timestamp = delivery[TIMESTAMP_KEY]
+def delivery_needs_processing(most_recently_processed_timestamp, record, env, activity_log_filepath):
+  id = record.guid
+  branch = record.branch
+  timestamp = record.timestamp
 
-  if ignore_repository(details, activity_log_filepath) == True:
-      update_activity_log(f"Ignoring delivery {id} based on repository ignore list", activity_log_filepath)
+  if ignore_repository(record.repo_name, activity_log_filepath) == True:
+      update_activity_log(f"Ignoring delivery {id} based on repository ignore list", activity_log_filepath, DEBUG)
       return False
 
   if branch != ENV_BRANCHES[env]:
       update_activity_log(
           f"Skipping delivery {id} for branch '{branch}' not matching environment branch '{ENV_BRANCHES[env]}'",
-          activity_log_filepath)
+          activity_log_filepath, DEBUG)
       return False
 
   try:
@@ -467,19 +849,19 @@ def delivery_needs_processing(most_recently_processed_timestamp, delivery, env,
   except (TypeError, ValueError):
     update_activity_log(
         f"Invalid most_recently_processed_timestamp: {most_recently_processed_timestamp}, defaulting to 0.0",
-        activity_log_filepath)
+        activity_log_filepath, WARNING)
     most_recently_processed_timestamp = 0.0
 
-  datetime_str = printable_date_time(details, activity_log_filepath)
+  datetime_str = record.local_datetime
   if timestamp > most_recently_processed_timestamp:
     update_activity_log(
         f"Delivery {id} ({datetime_str}) needs processing (timestamp: {timestamp} > most recent timestamp: {most_recently_processed_timestamp})",
-        activity_log_filepath)
+        activity_log_filepath, DEBUG)
     return True
 
   update_activity_log(
       f"Delivery {id} ({datetime_str}) does not need processing (timestamp: {timestamp} <= most recent timestamp: {most_recently_processed_timestamp})",
-      activity_log_filepath)
+      activity_log_filepath, DEBUG)
   return False
 
 def get_ignored_repos(ignore_file='.repoIgnore'):
@@ -491,13 +873,26 @@ def get_ignored_repos(ignore_file='.repoIgnore'):
             get_ignored_repos.cache = set()
     return get_ignored_repos.cache
 
-def ignore_repository(delivery_detail, activity_log_filepath):
-    requestPayload = delivery_detail.get(DELIVERY_DETAILS_REQUEST_KEY, {}).get(DELIVERY_DETAILS_PAYLOAD_KEY, {})
-    repository = requestPayload.get("repository", {})
-    repo_name = repository.get("name", "")
+def resolve_ignored_repository_ids(client, ignored_repos):
+    """
+    Resolves the names of the ignored repositories to repository ids, which is all the deliveries
+    list exposes about the repository. Names that cannot be resolved are only filtered once the
+    details of their deliveries are fetched, by ignore_repository.
+    """
+    repository_ids = set()
+    for repo_name in sorted(ignored_repos):
+      response = client.get(f"{GITHUB_API_URL}/repos/Fiserv/{repo_name}")
+      if not response.ok:
+        print(f"Unable to resolve ignored repository {repo_name}: {response.status_code}")
+        continue
+      repository_ids.add(response.json()["id"])
+    print(f"Resolved {len(repository_ids)} of {len(ignored_repos)} ignored repositories to ids")
+    return frozenset(repository_ids)
+
+def ignore_repository(repo_name, activity_log_filepath):
     ignored_repos = get_ignored_repos()
     if repo_name in ignored_repos:
-      update_activity_log(f"Ignoring repository: {repo_name}", activity_log_filepath)
+      update_activity_log(f"Ignoring repository: {repo_name}", activity_log_filepath, DEBUG)
       return True
     else:
       return False
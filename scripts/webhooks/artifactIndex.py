@@ -0,0 +1,467 @@
+"""
+Queryable SQLite index over the artifacts of the webhook analysis.
+
+`ingest` scans a directory of artifacts (e.g. a clone of developer-studio-webhook-artifacts)
+and adds the timed-out deliveries, blocked deliveries and activity log run totals it finds to
+the index. Every file is checkpointed: unchanged files are skipped, activity logs written as a
+single file are read from where the previous ingest stopped, and other files (sealed activity
+log segments included) are re-read only when they changed.
+Daily rollups of failures per environment, repository and failure type are kept up to date
+as files are ingested, so queries never re-parse artifacts:
+
+    python artifactIndex.py ingest ../../artifacts
+    python artifactIndex.py rollup --env prod --by repo --period week
+    python artifactIndex.py rollup --by env --period month --type timed_out
+    python artifactIndex.py failures --clientip 1.2.3.4 --since 2026-01-01
+
+Failure rates are reported against the number of deliveries analyzed, which activity logs
+only record per environment; grouping or filtering by repository reports counts only.
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+DEFAULT_INDEX_PATH = os.getenv("WEBHOOK_ARTIFACT_INDEX",
+                               os.path.join(os.path.expanduser("~"), ".cache", "webhook-artifact-index.sqlite"))
+BLOCKED = "blocked"
+TIMED_OUT = "timed_out"
+FAILURE_TYPES = [BLOCKED, TIMED_OUT]
+PERIODS = ["day", "week", "month"]
+GROUP_COLUMNS = {"env": "env", "repo": "repo", "type": "failure_type"}
+
+# Artifact kinds, matched against file names in this order
+TIMED_OUT_KIND = "timed_out"
+BLOCKED_REPORT_KIND = "blocked_report"
+BLOCKED_LOG_KIND = "blocked_log"
+ACTIVITY_LOG_KIND = "activity_log"
+ACTIVITY_SEGMENT_KIND = "activity_segment"
+DATE_PATTERN = r"(\d{2}-\d{2}-\d{4})"
+ARTIFACT_PATTERNS = [
+    (TIMED_OUT_KIND, re.compile(rf"^timed_out_deliveries_{DATE_PATTERN}_([a-z]+)\.json$")),
+    (BLOCKED_REPORT_KIND, re.compile(rf"^blocked_delivery_report_{DATE_PATTERN}_([a-z]+)\.json$")),
+    (BLOCKED_LOG_KIND, re.compile(rf"^blocked_delivery_{DATE_PATTERN}_([a-z]+)_.+\.log$")),
+    (ACTIVITY_LOG_KIND, re.compile(rf"^activity_log_{DATE_PATTERN}_([a-z]+)\.log$")),
+    (ACTIVITY_SEGMENT_KIND, re.compile(rf"^activity_log_{DATE_PATTERN}_([a-z]+)\.\d+\.log\.gz$")),
+]
+
+# Run totals logged at the end of every analysis of an environment
+RUN_TOTAL_PATTERNS = [
+    ("fetched", re.compile(r"^Total deliveries fetched: (\d+)")),
+    ("processed", re.compile(r"^Total number of deliveries needing to be processed: (\d+)")),
+    ("blocked", re.compile(r"^Total number of blocked webhooks: (\d+)")),
+    ("timed_out", re.compile(r"^Total number of timed_out webhooks: (\d+)")),
+]
+# Fields of the per-delivery blocked logs written before the blocked delivery report existed
+BLOCKED_LOG_FIELDS = {
+    "GitHub delivery Id": "guid",
+    "Timestamp": "timestamp",
+    "transid": "transid",
+    "clientip": "clientip",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    env TEXT NOT NULL,
+    day TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    guid TEXT NOT NULL,
+    failure_type TEXT NOT NULL,
+    source TEXT NOT NULL,
+    env TEXT NOT NULL,
+    day TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    branch TEXT,
+    timestamp REAL,
+    clientip TEXT,
+    transid TEXT,
+    redelivery_status TEXT,
+    PRIMARY KEY (guid, failure_type)
+);
+CREATE INDEX IF NOT EXISTS failures_by_source ON failures (source);
+CREATE INDEX IF NOT EXISTS failures_by_day ON failures (day, env);
+CREATE INDEX IF NOT EXISTS failures_by_clientip ON failures (clientip);
+CREATE INDEX IF NOT EXISTS failures_by_transid ON failures (transid);
+CREATE TABLE IF NOT EXISTS run_totals (
+    source TEXT PRIMARY KEY,
+    env TEXT NOT NULL,
+    day TEXT NOT NULL,
+    runs INTEGER NOT NULL DEFAULT 0,
+    fetched INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    timed_out INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS run_totals_by_day ON run_totals (day, env);
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    day TEXT NOT NULL,
+    env TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    failure_type TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    PRIMARY KEY (day, env, repo, failure_type)
+);
+"""
+
+def parse_artifact_name(filename):
+    """
+    Returns (kind, env, ISO day) of an artifact file name, or None if it is not indexed.
+    """
+    for kind, pattern in ARTIFACT_PATTERNS:
+        match = pattern.match(filename)
+        if match:
+            day = datetime.strptime(match.group(1), "%m-%d-%Y").strftime("%Y-%m-%d")
+            return kind, match.group(2), day
+    return None
+
+def repository_of(payload):
+    return ((payload or {}).get("repository") or {}).get("name") or "unknown"
+
+def branch_of(payload):
+    return (payload or {}).get("ref", "").replace("refs/heads/", "")
+
+class ArtifactIndex:
+    """
+    SQLite index of webhook analysis artifacts with per-file checkpoints and daily rollups.
+
+    Each artifact file is ingested in its own transaction together with its checkpoint and the
+    rollups of its day and environment, so an interrupted ingest never counts a file twice.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def ingest(self, artifacts_path):
+        """
+        Ingests new and changed artifacts under `artifacts_path`. Returns a summary of the work done.
+        """
+        summary = {"files": 0, "ingested": 0, "unchanged": 0, "failures": 0, "runs": 0}
+        for filename in sorted(os.listdir(artifacts_path)):
+            parsed = parse_artifact_name(filename)
+            if parsed is None:
+                continue
+            summary["files"] += 1
+            filepath = os.path.join(artifacts_path, filename)
+            stat = os.stat(filepath)
+            checkpoint = self.db.execute("SELECT size, mtime_ns, offset FROM files WHERE path = ?", (filename,)).fetchone()
+            if checkpoint and checkpoint["size"] == stat.st_size and checkpoint["mtime_ns"] == stat.st_mtime_ns:
+                summary["unchanged"] += 1
+                continue
+            with self.db:
+                self._ingest_file(filepath, filename, parsed, stat, checkpoint, summary)
+            summary["ingested"] += 1
+        return summary
+
+    def _ingest_file(self, filepath, filename, parsed, stat, checkpoint, summary):
+        kind, env, day = parsed
+        offset = 0
+        if kind == ACTIVITY_LOG_KIND:
+            # Activity logs only grow; a log that got shorter was replaced and is read again
+            if checkpoint and stat.st_size >= checkpoint["size"]:
+                offset = checkpoint["offset"]
+            else:
+                self.db.execute("DELETE FROM run_totals WHERE source = ?", (filename,))
+            offset, runs = self._ingest_activity_log(filepath, filename, env, day, offset)
+            summary["runs"] += runs
+        elif kind == ACTIVITY_SEGMENT_KIND:
+            # Sealed segments are complete and never appended to, so they are always read in full
+            self.db.execute("DELETE FROM run_totals WHERE source = ?", (filename,))
+            _, runs = self._ingest_activity_log(filepath, filename, env, day, 0, opener=gzip.open)
+            summary["runs"] += runs
+            offset = stat.st_size
+        else:
+            # JSON artifacts are rewritten as a whole, so their rows are replaced
+            self.db.execute("DELETE FROM failures WHERE source = ?", (filename,))
+            if kind == TIMED_OUT_KIND:
+                rows = self._timed_out_rows(filepath)
+            elif kind == BLOCKED_REPORT_KIND:
+                rows = self._blocked_report_rows(filepath)
+            else:
+                rows = self._blocked_log_rows(filepath)
+            for row in rows:
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO failures (guid, failure_type, source, env, day, repo, branch, timestamp, "
+                    "clientip, transid, redelivery_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (row["guid"], row["failure_type"], filename, env, day, row["repo"], row.get("branch"),
+                     row.get("timestamp"), row.get("clientip"), row.get("transid"), row.get("redelivery_status")))
+                summary["failures"] += cursor.rowcount
+            self._refresh_rollup(day, env)
+            offset = stat.st_size
+        self.db.execute(
+            "INSERT OR REPLACE INTO files (path, kind, env, day, size, mtime_ns, offset, ingested_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, kind, env, day, stat.st_size, stat.st_mtime_ns, offset, time.time()))
+
+    def _refresh_rollup(self, day, env):
+        self.db.execute("DELETE FROM daily_rollup WHERE day = ? AND env = ?", (day, env))
+        self.db.execute(
+            "INSERT INTO daily_rollup (day, env, repo, failure_type, failures) "
+            "SELECT day, env, repo, failure_type, COUNT(*) FROM failures WHERE day = ? AND env = ? "
+            "GROUP BY day, env, repo, failure_type", (day, env))
+
+    def _timed_out_rows(self, filepath):
+        records = load_json(filepath)
+        for record in records if isinstance(records, list) else []:
+            if not record.get("delivery_id"):
+                continue
+            yield {
+                "guid": record["delivery_id"],
+                "failure_type": TIMED_OUT,
+                "repo": repository_of(record.get("payload")),
+                "branch": branch_of(record.get("payload")),
+                "timestamp": record.get("timestamp"),
+                "redelivery_status": (record.get("redelivery") or {}).get("status")
+            }
+
+    def _blocked_report_rows(self, filepath):
+        report = load_json(filepath)
+        deliveries = report.get("deliveries") if isinstance(report, dict) else None
+        for guid, entry in (deliveries or {}).items():
+            yield {
+                "guid": guid,
+                "failure_type": BLOCKED,
+                "repo": entry.get("repository") or "unknown",
+                "branch": entry.get("branch"),
+                "timestamp": entry.get("timestamp"),
+                "clientip": entry.get("clientip"),
+                "transid": entry.get("transid")
+            }
+
+    def _blocked_log_rows(self, filepath):
+        fields = {}
+        with open(filepath, "r", errors="replace") as f:
+            content = f.read()
+        for line in content.splitlines():
+            name, _, value = line.partition(": ")
+            if name in BLOCKED_LOG_FIELDS:
+                fields[BLOCKED_LOG_FIELDS[name]] = None if value == "None" else value
+        if not fields.get("guid"):
+            return
+        payload = None
+        if "request payload: " in content:
+            try:
+                payload = json.loads(content.split("request payload: ", 1)[1].rsplit("\n*****", 1)[0])
+            except json.JSONDecodeError:
+                pass
+        try:
+            timestamp = float(fields.get("timestamp"))
+        except (TypeError, ValueError):
+            timestamp = None
+        yield dict(fields, failure_type=BLOCKED, repo=repository_of(payload), branch=branch_of(payload),
+                   timestamp=timestamp)
+
+    def _ingest_activity_log(self, filepath, filename, env, day, offset, opener=open):
+        """
+        Adds the run totals logged after `offset` and returns (new offset, runs found). Only
+        complete lines are read, so a log still being written is continued where it left off.
+        """
+        totals = dict.fromkeys(["runs", "fetched", "processed", "blocked", "timed_out"], 0)
+        with opener(filepath, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode("utf-8", "replace").splitlines():
+            message = line
+            if line.startswith("{"):
+                try:
+                    message = json.loads(line).get("message", "")
+                except (json.JSONDecodeError, AttributeError):
+                    pass
+            for name, pattern in RUN_TOTAL_PATTERNS:
+                match = pattern.match(message)
+                if match:
+                    totals[name] += int(match.group(1))
+                    # Every analysis logs its fetched total exactly once
+                    if name == "fetched":
+                        totals["runs"] += 1
+                    break
+        self.db.execute("INSERT OR IGNORE INTO run_totals (source, env, day) VALUES (?, ?, ?)", (filename, env, day))
+        self.db.execute(
+            "UPDATE run_totals SET runs = runs + ?, fetched = fetched + ?, processed = processed + ?, "
+            "blocked = blocked + ?, timed_out = timed_out + ? WHERE source = ?",
+            (totals["runs"], totals["fetched"], totals["processed"], totals["blocked"], totals["timed_out"], filename))
+        return offset + end, totals["runs"]
+
+    def rollup(self, period="day", group_by=(), env=None, repo=None, failure_type=None, since=None, until=None):
+        """
+        Returns failure counts per period and `group_by` columns from the daily rollups. Unless the
+        rows are split or filtered by repository, each row also gets the number of deliveries
+        analyzed in that period and the failure rate.
+        """
+        period_expr = period_expression(period)
+        columns = [GROUP_COLUMNS[name] for name in group_by]
+        filters, params = build_filters(env=env, since=since, until=until)
+        if repo:
+            filters.append("repo = ?")
+            params.append(repo)
+        if failure_type:
+            filters.append("failure_type = ?")
+            params.append(failure_type)
+        select = ", ".join([f"{period_expr} AS period"] + columns)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        rows = [dict(row) for row in self.db.execute(
+            f"SELECT {select}, SUM(failures) AS failures FROM daily_rollup {where} "
+            f"GROUP BY {', '.join(['period'] + columns)} ORDER BY {', '.join(['period'] + columns)}", params)]
+        if repo or "repo" in columns:
+            return rows
+
+        # Deliveries analyzed are only known per environment, and only split by environment. The
+        # processed total of a run leaves out timed-out deliveries, so they are added back
+        total_columns = [column for column in columns if column == "env"]
+        filters, params = build_filters(env=env, since=since, until=until)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        totals = {}
+        for row in self.db.execute(
+                f"SELECT {', '.join([f'{period_expr} AS period'] + total_columns)}, SUM(processed + timed_out) AS analyzed "
+                f"FROM run_totals {where} GROUP BY {', '.join(['period'] + total_columns)}", params):
+            totals[tuple(row[name] for name in ["period"] + total_columns)] = row["analyzed"]
+        for row in rows:
+            analyzed = totals.get(tuple(row[name] for name in ["period"] + total_columns))
+            row["analyzed"] = analyzed
+            row["failure_rate"] = round(row["failures"] / analyzed, 4) if analyzed else None
+        return rows
+
+    def failures(self, guid=None, clientip=None, transid=None, env=None, repo=None, failure_type=None, since=None,
+                 until=None, limit=100):
+        """
+        Returns the indexed failures matching every given filter, newest first.
+        """
+        filters, params = build_filters(env=env, since=since, until=until)
+        for column, value in [("guid", guid), ("clientip", clientip), ("transid", transid), ("repo", repo),
+                              ("failure_type", failure_type)]:
+            if value:
+                filters.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        return [dict(row) for row in self.db.execute(
+            f"SELECT day, env, failure_type, guid, repo, branch, timestamp, clientip, transid, redelivery_status "
+            f"FROM failures {where} ORDER BY day DESC, timestamp DESC LIMIT ?", params + [limit])]
+
+def period_expression(period):
+    if period == "week":
+        # Monday of the ISO week
+        return "date(day, 'weekday 0', '-6 days')"
+    if period == "month":
+        return "strftime('%Y-%m', day)"
+    return "day"
+
+def build_filters(env=None, since=None, until=None):
+    filters, params = [], []
+    if env:
+        filters.append("env = ?")
+        params.append(env)
+    if since:
+        filters.append("day >= ?")
+        params.append(since)
+    if until:
+        filters.append("day <= ?")
+        params.append(until)
+    return filters, params
+
+def load_json(filepath):
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a YYYY-MM-DD date")
+
+def parse_group_by(value):
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in GROUP_COLUMNS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"{', '.join(unknown)} not in {list(GROUP_COLUMNS)}")
+    return names
+
+def print_rows(rows, as_json):
+    if as_json:
+        print(json.dumps(rows, indent=4))
+        return
+    if not rows:
+        print("No matching rows")
+        return
+    columns = list(rows[0].keys())
+    cells = [[("" if row[column] is None else str(row[column])) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[i]) for line in cells)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+def add_filter_arguments(parser):
+    parser.add_argument("--env", help="Only this environment")
+    parser.add_argument("--repo", help="Only this repository")
+    parser.add_argument("--type", dest="failure_type", choices=FAILURE_TYPES, help="Only this failure type")
+    parser.add_argument("--since", type=parse_day, help="First day to include (YYYY-MM-DD)")
+    parser.add_argument("--until", type=parse_day, help="Last day to include (YYYY-MM-DD)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Index webhook analysis artifacts and query their history")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help=f"SQLite index file (default: {DEFAULT_INDEX_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Add new and changed artifacts to the index")
+    ingest_parser.add_argument("artifacts_path", help="Directory holding the artifact files")
+
+    rollup_parser = subparsers.add_parser("rollup", help="Failure counts and rates per period")
+    rollup_parser.add_argument("--period", choices=PERIODS, default="day", help="Length of a period (default: day)")
+    rollup_parser.add_argument("--by", type=parse_group_by, default=[],
+                               help=f"Comma-separated columns to split each period by: {', '.join(GROUP_COLUMNS)}")
+    add_filter_arguments(rollup_parser)
+    rollup_parser.add_argument("--json", action="store_true", help="Print the rows as JSON")
+
+    failures_parser = subparsers.add_parser("failures", help="List individual blocked and timed-out deliveries")
+    failures_parser.add_argument("--guid", help="GitHub delivery id")
+    failures_parser.add_argument("--clientip", help="Client IP reported by the WAF")
+    failures_parser.add_argument("--transid", help="WAF transaction id")
+    add_filter_arguments(failures_parser)
+    failures_parser.add_argument("--limit", type=int, default=100, help="Maximum number of rows (default: 100)")
+    failures_parser.add_argument("--json", action="store_true", help="Print the rows as JSON")
+    args = parser.parse_args()
+
+    index = ArtifactIndex(args.index)
+    try:
+        if args.command == "ingest":
+            if not os.path.isdir(args.artifacts_path):
+                print(f"{args.artifacts_path} is not a directory", file=sys.stderr)
+                sys.exit(1)
+            start = time.perf_counter()
+            summary = index.ingest(args.artifacts_path)
+            print(f"Ingested {summary['ingested']} of {summary['files']} artifact files ({summary['unchanged']} unchanged): "
+                  f"{summary['failures']} failures, {summary['runs']} runs in {time.perf_counter() - start:.2f}s")
+        elif args.command == "rollup":
+            print_rows(index.rollup(args.period, args.by, args.env, args.repo, args.failure_type, args.since, args.until),
+                       args.json)
+        else:
+            print_rows(index.failures(args.guid, args.clientip, args.transid, args.env, args.repo, args.failure_type,
+                                      args.since, args.until, args.limit), args.json)
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    main()
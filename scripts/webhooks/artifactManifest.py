@@ -0,0 +1,70 @@
+import hashlib
+import json
+
+from analysisCheckpoint import atomic_write
+
+MANIFEST_FILENAME = ".artifact_manifest.json"
+
+def git_blob_sha(content):
+    """
+    Returns the sha git assigns to a blob with `content` (bytes), as reported by the Contents
+    and Git Data APIs.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+def get_manifest_filepath(artifacts_path):
+    return f"{artifacts_path}/{MANIFEST_FILENAME}"
+
+class ArtifactManifest:
+    """
+    Blob shas of the artifacts as last persisted to the artifacts repository, keyed by their
+    path in the repository.
+
+    A file whose local blob sha matches the manifest is already in the repository and is not
+    uploaded again; for a changed file the recorded sha is the one the Contents API expects,
+    so it does not have to be looked up first. The manifest assumes the artifact files are only
+    written by this job; an upload rejected because the recorded sha is stale falls back to
+    looking up the current one. Counters report what the manifest saved.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.blobs = {}
+        self.skipped = 0
+        self.bytes_skipped = 0
+        self.lookups_avoided = 0
+
+    @classmethod
+    def load(cls, filepath):
+        manifest = cls(filepath)
+        try:
+            with open(filepath, "r") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                manifest.blobs = {path: sha for path, sha in data.items() if isinstance(sha, str)}
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        return manifest
+
+    def get(self, repo_file_path):
+        return self.blobs.get(repo_file_path)
+
+    def unchanged(self, repo_file_path, content):
+        """
+        True if `content` is what was last persisted at `repo_file_path`; counts the skipped upload.
+        """
+        if self.blobs.get(repo_file_path) != git_blob_sha(content):
+            return False
+        self.skipped += 1
+        self.bytes_skipped += len(content)
+        return True
+
+    def record(self, repo_file_path, sha):
+        self.blobs[repo_file_path] = sha
+
+    def save(self):
+        atomic_write(self.filepath, json.dumps(self.blobs, indent=4, sort_keys=True))
+
+    def summary(self):
+        return (f"{self.skipped} unchanged files not uploaded ({self.bytes_skipped} bytes saved), "
+                f"{self.lookups_avoided} sha lookups avoided")
@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+
+from deliveryRecord import attempt_outcome, DELIVERED, BLOCKED, TIMED_OUT, FAILED
+from incrementalState import delivered_at_epoch
+
+class AttemptChain:
+    """
+    The attempts of one logical delivery (one guid): the original delivery and its redeliveries.
+    """
+    __slots__ = ("guid", "latest_id", "latest_status_code", "attempts", "first_attempt_at", "first_success_at")
+
+    def __init__(self, delivery):
+        self.guid = delivery.get("guid")
+        self.latest_id = delivery.get("id")
+        self.latest_status_code = delivery.get("status_code")
+        self.attempts = 0
+        self.first_attempt_at = None
+        self.first_success_at = None
+        self.add(delivery)
+
+    def add(self, delivery):
+        self.attempts += 1
+        delivered_at = delivered_at_epoch(delivery)
+        if delivered_at is None:
+            return
+        if self.first_attempt_at is None or delivered_at < self.first_attempt_at:
+            self.first_attempt_at = delivered_at
+        if attempt_outcome(delivery.get("status_code")) == DELIVERED and (
+                self.first_success_at is None or delivered_at < self.first_success_at):
+            self.first_success_at = delivered_at
+
+    @property
+    def outcome(self):
+        return attempt_outcome(self.latest_status_code)
+
+    @property
+    def time_to_success(self):
+        if self.first_success_at is None or self.first_attempt_at is None:
+            return None
+        return self.first_success_at - self.first_attempt_at
+
+    def to_fields(self):
+        """
+        Fields recorded with the delivery in the artifacts.
+        """
+        return {
+            "attempts": self.attempts,
+            "first_attempt_at": (datetime.fromtimestamp(self.first_attempt_at, timezone.utc).isoformat()
+                                 if self.first_attempt_at is not None else None),
+            "time_to_success_seconds": self.time_to_success
+        }
+
+class AttemptChains:
+    """
+    Groups the attempts listed during a run into chains by guid.
+
+    Deliveries are listed newest first, so the first attempt listed for a guid is its latest
+    one: it is the only attempt whose details are fetched and classified, and the older
+    attempts listed after it are only counted into its chain. Attempt counts cover the
+    attempts listed by the run, so attempts older than where paging stopped are not included.
+
+    An original attempt can also be listed by a later run than its redelivery, e.g. when a run
+    is resumed. `latest_attempts` (guid -> [id, delivered_at epoch]) remembers the latest
+    attempt of every delivery whose latest attempt was a redelivery, across runs: the caller
+    persists it, and attempts older than the one recorded there are only counted.
+    """
+
+    def __init__(self, latest_attempts=None):
+        self.chains = {}
+        self.collapsed = 0
+        self.latest_attempt_ids = latest_attempts if latest_attempts is not None else {}
+
+    def latest_attempts(self, deliveries):
+        """
+        Adds a page of listed deliveries to the chains and returns the ones that are the latest
+        attempt of their guid. Entries without a guid are returned as they are.
+        """
+        latest = []
+        for delivery in deliveries:
+            guid = delivery.get("guid")
+            if not guid:
+                latest.append(delivery)
+                continue
+            chain = self.chains.get(guid)
+            known = self.latest_attempt_ids.get(guid)
+            if chain is None and known and delivery.get("id", 0) < known[0]:
+                # A previous run already handled a newer attempt of this delivery
+                self.collapsed += 1
+            elif chain is None:
+                self.chains[guid] = AttemptChain(delivery)
+                if delivery.get("redelivery") and delivery.get("id") is not None:
+                    self.latest_attempt_ids[guid] = [delivery.get("id"), delivered_at_epoch(delivery)]
+                latest.append(delivery)
+            else:
+                chain.add(delivery)
+                self.collapsed += 1
+        return latest
+
+    def get(self, guid):
+        return self.chains.get(guid)
+
+    def summary(self):
+        outcomes = {DELIVERED: 0, BLOCKED: 0, TIMED_OUT: 0, FAILED: 0}
+        times_to_success = []
+        retried = 0
+        for chain in self.chains.values():
+            outcomes[chain.outcome] += 1
+            if chain.attempts > 1:
+                retried += 1
+                if chain.time_to_success is not None:
+                    times_to_success.append(chain.time_to_success)
+        times_to_success.sort()
+        return {
+            "deliveries": len(self.chains),
+            "attempts_collapsed": self.collapsed,
+            "retried": retried,
+            "outcomes": outcomes,
+            "median_time_to_success_seconds": times_to_success[len(times_to_success) // 2] if times_to_success else None
+        }
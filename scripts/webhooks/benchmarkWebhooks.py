@@ -0,0 +1,165 @@
+"""
+Offline benchmark of the webhook scripts against the fake GitHub API in fakeGitHub.py.
+
+Every scenario starts a fresh fake server, runs one of the scripts in a child process pointed
+at it through GITHUB_API_URL, and reports wall time, HTTP requests, bytes transferred and the
+peak RSS of the child:
+
+    python benchmarkWebhooks.py --deliveries 2000 --payload-size 16384 --latency-ms 20
+    python benchmarkWebhooks.py --scenario analyze-cold --output results.json
+    python benchmarkWebhooks.py --baseline results.json
+
+Scenarios with a warm-up run the script once first (unmeasured) so caches or the incremental
+cursor are in place. With --replay, the server serves a cassette recorded with
+`fakeGitHub.py --record` instead of synthetic deliveries.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fakeGitHub
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ANALYZE_SCRIPT = os.path.join(SCRIPTS_DIR, "analyzeWebhookDeliveries.py")
+REDELIVER_SCRIPT = os.path.join(os.path.dirname(SCRIPTS_DIR), "RedeliverWebhooks.py")
+
+SCENARIOS = [
+    {"name": "analyze-cold", "script": ANALYZE_SCRIPT,
+     "args": ["prod", "{artifacts}", "--no-cache"]},
+    {"name": "analyze-batched-persist", "script": ANALYZE_SCRIPT,
+     "args": ["prod", "{artifacts}", "--no-cache", "--persist-mode", "batched"]},
+    {"name": "analyze-warm-cache", "script": ANALYZE_SCRIPT,
+     "args": ["prod", "{artifacts}", "--cache-dir", "{cache}"], "warmup": True},
+    {"name": "analyze-incremental", "script": ANALYZE_SCRIPT,
+     "args": ["prod", "{artifacts}", "--no-cache", "--incremental"], "warmup": True, "share_artifacts": True},
+    {"name": "analyze-all-envs", "script": ANALYZE_SCRIPT,
+     "args": ["all", "{artifacts}", "--no-cache", "--persist-mode", "batched"]},
+    {"name": "redeliver", "script": REDELIVER_SCRIPT,
+     "args": ["Fiserv/tenant-repo-0", "--lookback-hours", "72"]},
+    {"name": "redeliver-org-sweep", "script": REDELIVER_SCRIPT,
+     "args": ["--org", "Fiserv", "--lookback-hours", "72", "--concurrency", "8"]},
+]
+RESULT_METRICS = ["wall_seconds", "requests", "bytes_transferred", "peak_rss_mb"]
+
+def run_child(script, script_args, env):
+    """
+    Runs a script to completion and returns (exit status, wall seconds, peak RSS in MB) of that child.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, script] + script_args, cwd=SCRIPTS_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4 reports the resource usage of this child only
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    stderr = process.stderr.read().decode("utf-8", "replace")
+    process.stderr.close()
+    if process.returncode != 0:
+        print(f"{os.path.basename(script)} exited with {process.returncode}:\n{stderr[-2000:]}", file=sys.stderr)
+    # ru_maxrss is in kilobytes on Linux
+    return process.returncode, wall_seconds, usage.ru_maxrss / 1024
+
+def run_scenario(scenario, server_options, cassette=None):
+    server = fakeGitHub.start_server(cassette=cassette, **server_options)
+    workdir = tempfile.mkdtemp(prefix=f"benchmark-{scenario['name']}-")
+    try:
+        paths = {"artifacts": os.path.join(workdir, "artifacts"), "cache": os.path.join(workdir, "cache")}
+        os.makedirs(paths["artifacts"])
+        env = dict(os.environ,
+                   GITHUB_API_URL=server.base_url,
+                   GITHUB_TENANT_REPO_AUTH_TOKEN="benchmark",
+                   TEST_GITHUB_AUTH_TOKEN="benchmark",
+                   WEBHOOK_DELIVERY_CACHE_DIR=paths["cache"])
+
+        if scenario.get("warmup"):
+            warmup_paths = dict(paths)
+            if not scenario.get("share_artifacts"):
+                warmup_paths["artifacts"] = os.path.join(workdir, "warmup-artifacts")
+                os.makedirs(warmup_paths["artifacts"])
+            run_child(scenario["script"], [arg.format(**warmup_paths) for arg in scenario["args"]], env)
+            server.reset_stats()
+
+        exit_code, wall_seconds, peak_rss_mb = run_child(
+            scenario["script"], [arg.format(**paths) for arg in scenario["args"]], env)
+        stats = server.stats()
+        return {
+            "scenario": scenario["name"],
+            "exit_code": exit_code,
+            "wall_seconds": round(wall_seconds, 3),
+            "requests": stats["requests"],
+            "bytes_transferred": stats["bytes_sent"] + stats["bytes_received"],
+            "peak_rss_mb": round(peak_rss_mb, 1),
+            "endpoints": stats["endpoints"]
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_results(results, baseline=None):
+    baseline_by_name = {result["scenario"]: result for result in (baseline or {}).get("results", [])}
+    header = f"{'scenario':<26}{'wall s':>10}{'requests':>10}{'bytes':>14}{'peak MB':>10}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(f"{result['scenario']:<26}{result['wall_seconds']:>10.2f}{result['requests']:>10}"
+              f"{result['bytes_transferred']:>14}{result['peak_rss_mb']:>10.1f}"
+              + ("" if result["exit_code"] == 0 else f"  (exit {result['exit_code']})"))
+        previous = baseline_by_name.get(result["scenario"])
+        if previous:
+            deltas = []
+            for metric in RESULT_METRICS:
+                if previous.get(metric):
+                    deltas.append(f"{metric} {100.0 * (result[metric] - previous[metric]) / previous[metric]:+.1f}%")
+            print(f"{'':<26}vs baseline: {', '.join(deltas)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the webhook scripts against a local fake GitHub API")
+    parser.add_argument("--deliveries", type=int, default=fakeGitHub.DEFAULT_DELIVERY_COUNT,
+                        help=f"Synthetic deliveries per hook (default: {fakeGitHub.DEFAULT_DELIVERY_COUNT})")
+    parser.add_argument("--payload-size", type=int, default=fakeGitHub.DEFAULT_PAYLOAD_SIZE,
+                        help=f"Approximate push payload size in bytes (default: {fakeGitHub.DEFAULT_PAYLOAD_SIZE})")
+    parser.add_argument("--latency-ms", type=float, default=10, help="Latency injected into every response (default: 10)")
+    parser.add_argument("--redelivery-every", type=int, default=0,
+                        help="Make every Nth synthetic delivery a redelivery attempt")
+    parser.add_argument("--scenario", action="append", choices=[scenario["name"] for scenario in SCENARIOS],
+                        help="Scenario to run; may be repeated (default: all)")
+    parser.add_argument("--replay", metavar="CASSETTE", help="Serve a recorded cassette instead of synthetic data")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --output")
+    args = parser.parse_args()
+
+    server_options = {
+        "delivery_count": args.deliveries,
+        "payload_size": args.payload_size,
+        "latency_ms": args.latency_ms,
+        "redelivery_every": args.redelivery_every
+    }
+    selected = [scenario for scenario in SCENARIOS if not args.scenario or scenario["name"] in args.scenario]
+
+    results = []
+    for scenario in selected:
+        cassette = fakeGitHub.Cassette.load(args.replay) if args.replay else None
+        print(f"Running {scenario['name']}...", file=sys.stderr)
+        results.append(run_scenario(scenario, server_options, cassette))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"parameters": server_options, "results": results}, f, indent=4)
+
+    if any(result["exit_code"] != 0 for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
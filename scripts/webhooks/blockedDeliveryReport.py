@@ -0,0 +1,76 @@
+import json
+from collections import Counter
+
+from journaledStore import JournaledJsonStore
+
+class BlockedDeliveryReport(JournaledJsonStore):
+    """
+    Per-day, per-environment report of the deliveries blocked by the WAF, one JSON document.
+
+    Deliveries are kept by GitHub delivery id (guid). The exported report adds lookup indexes
+    by client IP and by WAF transid and counts of blocked deliveries per client IP and per
+    repository, so a WAF incident can be triaged from this file alone. Entries are journaled
+    as they are added or updated and the report is written once by export() at the end of the run.
+    """
+    key_field = "guid"
+
+    def __init__(self, filepath, env, date, webhook):
+        super().__init__(filepath)
+        self.env = env
+        self.date = date
+        self.webhook = webhook
+
+    @property
+    def deliveries(self):
+        return self.entries
+
+    def _load(self, data):
+        if isinstance(data, dict) and isinstance(data.get("deliveries"), dict):
+            self.entries.update(data["deliveries"])
+
+    def _document(self):
+        return json.dumps(self.to_dict(), indent=4)
+
+    def add(self, record):
+        """
+        Adds a blocked DeliveryRecord unless its guid is already in the report. Returns True if it was added.
+        """
+        if record.guid in self.entries:
+            return False
+        return self._add({
+            "guid": record.guid,
+            "hook_delivery_id": record.delivery_id,
+            "timestamp": record.timestamp,
+            "repository": record.repo_name,
+            "branch": record.branch,
+            "transid": record.transid,
+            "clientip": record.clientip,
+            "clientport": record.clientport,
+            "request_payload": record.request_payload
+        })
+
+    def to_dict(self):
+        by_clientip = {}
+        by_transid = {}
+        for guid, entry in self.deliveries.items():
+            if entry.get("clientip"):
+                by_clientip.setdefault(entry["clientip"], []).append(guid)
+            if entry.get("transid"):
+                by_transid.setdefault(entry["transid"], []).append(guid)
+        clientip_counts = Counter(entry.get("clientip") or "unknown" for entry in self.deliveries.values())
+        repository_counts = Counter(entry.get("repository") or "unknown" for entry in self.deliveries.values())
+        return {
+            "env": self.env,
+            "date": self.date,
+            "webhook": self.webhook,
+            "total": len(self.deliveries),
+            "counts": {
+                "clientip": dict(clientip_counts.most_common()),
+                "repository": dict(repository_counts.most_common())
+            },
+            "index": {
+                "clientip": by_clientip,
+                "transid": by_transid
+            },
+            "deliveries": self.deliveries
+        }
@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.getenv("WEBHOOK_DELIVERY_CACHE_DIR",
+                              os.path.join(os.path.expanduser("~"), ".cache", "webhook-deliveries"))
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_CACHE_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+CACHE_FILE_EXTENSION = ".json.gz"
+TMP_FILE_EXTENSION = ".tmp"
+# Temporary files this old were left by a writer that crashed, not one still writing
+TMP_FILE_GRACE_SECONDS = 60 * 60
+
+class DeliveryDetailCache:
+    """
+    On-disk cache of webhook delivery detail documents, keyed by hook id and delivery id.
+
+    Delivery details never change once GitHub has written them, so entries are never
+    revalidated; they are only evicted when older than `max_age_seconds` or when the cache
+    grows past `max_bytes` (least recently used first). Entries are stored as gzip-compressed
+    JSON at `<cache_dir>/<hook_id>/<delivery_id>.json.gz` and written atomically, so the cache
+    is safe to share between concurrent fetch workers and back-to-back environment runs.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                 max_age_seconds=DEFAULT_CACHE_MAX_AGE_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, hook_id, delivery_id):
+        return os.path.join(self.cache_dir, str(hook_id), f"{delivery_id}{CACHE_FILE_EXTENSION}")
+
+    def get(self, hook_id, delivery_id):
+        """
+        Returns the cached detail document or None on a miss.
+        """
+        path = self._entry_path(hook_id, delivery_id)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                details = json.load(f)
+            # Touch the entry so size-based eviction drops the least recently used entries first
+            os.utime(path)
+        except (FileNotFoundError, OSError, EOFError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return details
+
+    def put(self, hook_id, delivery_id, details):
+        path = self._entry_path(hook_id, delivery_id)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=TMP_FILE_EXTENSION)
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(details, separators=(",", ":")).encode("utf-8"))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.writes += 1
+
+    def evict(self, now=None):
+        """
+        Removes entries older than `max_age_seconds`, then the least recently used entries
+        until the cache fits in `max_bytes`. Returns the number of entries removed.
+
+        Only finished entries are evicted. Temporary files of concurrent writers are left alone
+        unless they are older than TMP_FILE_GRACE_SECONDS; other files are never touched.
+        """
+        now = now if now is not None else time.time()
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(CACHE_FILE_EXTENSION):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                elif name.endswith(TMP_FILE_EXTENSION) and now - stat.st_mtime > TMP_FILE_GRACE_SECONDS:
+                    _remove(path)
+
+        removed = 0
+        total_bytes = 0
+        kept = []
+        for mtime, size, path in entries:
+            if now - mtime > self.max_age_seconds:
+                removed += _remove(path)
+            else:
+                kept.append((mtime, size, path))
+                total_bytes += size
+
+        kept.sort()
+        for mtime, size, path in kept:
+            if total_bytes <= self.max_bytes:
+                break
+            removed += _remove(path)
+            total_bytes -= size
+
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,119 @@
+import re
+from datetime import datetime
+
+GITHUB_DELIVERY_HEADER = "X-Github-Delivery"
+SIGNATURE_HEADER = "X-Hub-Signature-256"
+# One scan of a WAF block page extracts every _event_* field
+WAF_FIELD_PATTERN = re.compile(r"_event_(transid|clientip|clientport)='([^']+)'")
+BLOCKED_STATUS_CODE = 200
+# GitHub only lists the deliveries of the past 3 days
+DELIVERY_RETENTION_SECONDS = 3 * 24 * 60 * 60
+
+# Outcomes of a delivery attempt
+DELIVERED = "delivered"
+BLOCKED = "blocked"
+TIMED_OUT = "timed_out"
+FAILED = "failed"
+
+def attempt_outcome(status_code):
+    """
+    Classifies a delivery attempt by the status code of its deliveries list entry. Timeouts
+    (status 0) and 5xx responses both mean the endpoint is overloaded and are worth retrying later.
+    """
+    if not status_code or status_code >= 500:
+        return TIMED_OUT
+    if status_code == BLOCKED_STATUS_CODE:
+        return BLOCKED
+    if 200 <= status_code < 300:
+        return DELIVERED
+    return FAILED
+
+def parse_head_commit_timestamp(timestamp):
+    """
+    Parses the ISO 8601 timestamp of a head_commit into a local time epoch, or None if missing/invalid.
+    The timestamp from the head_commit is the timestamp of the most recent commit in the push that triggered the webhook.
+    It is not the timestamp of the delivery itself -- this is not available in the GitHub API or the webhook payload.
+    """
+    if not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp).astimezone().timestamp()
+    except (TypeError, ValueError):
+        return None
+
+class DeliveryRecord:
+    """
+    Compact, parse-once view of a webhook delivery.
+
+    The nested detail document of a delivery is walked exactly once, when the record is built,
+    and only the fields the analysis uses are kept, including whether the payload has a
+    head_commit and its parsed timestamp (None if missing or invalid). The request payload is retained only for
+    deliveries whose artifacts embed it (timed-out and blocked deliveries); for every other
+    delivery the detail document can be released as soon as the record exists.
+    """
+    __slots__ = ("delivery_id", "guid", "timestamp", "branch", "repo_name", "status_code", "timed_out",
+                 "signature", "transid", "clientip", "clientport", "request_payload", "has_head_commit",
+                 "head_commit_timestamp")
+
+    def __init__(self, delivery_id, guid, timestamp, branch="", repo_name="", status_code=None, timed_out=False,
+                 signature=None, transid=None, clientip=None, clientport=None, request_payload=None,
+                 has_head_commit=True, head_commit_timestamp=None):
+        self.has_head_commit = has_head_commit
+        self.head_commit_timestamp = head_commit_timestamp
+        self.delivery_id = delivery_id
+        self.guid = guid
+        self.timestamp = timestamp
+        self.branch = branch
+        self.repo_name = repo_name
+        self.status_code = status_code
+        self.timed_out = timed_out
+        self.signature = signature
+        self.transid = transid
+        self.clientip = clientip
+        self.clientport = clientport
+        self.request_payload = request_payload
+
+    @classmethod
+    def from_details(cls, delivery, details):
+        """
+        Builds a record from a list entry and its detail document.
+        """
+        request = details.get("request", {})
+        headers = request.get("headers") or {}
+        payload = request.get("payload") or {}
+        head_commit = payload.get("head_commit") or {}
+        head_commit_timestamp = head_commit.get("timestamp")
+        response = details.get("response", {})
+        response_payload = response.get("payload", "")
+        timed_out = not response.get("headers") and response_payload == ""
+        status_code = details.get("status_code")
+
+        record = cls(
+            delivery.get("id"),
+            headers.get(GITHUB_DELIVERY_HEADER),
+            parse_head_commit_timestamp(head_commit_timestamp) if head_commit else None,
+            branch=payload.get("ref", "").replace("refs/heads/", ""),
+            repo_name=payload.get("repository", {}).get("name", ""),
+            status_code=status_code,
+            timed_out=timed_out,
+            signature=headers.get(SIGNATURE_HEADER),
+            has_head_commit=bool(head_commit),
+            head_commit_timestamp=head_commit_timestamp)
+
+        if timed_out or status_code == BLOCKED_STATUS_CODE:
+            record.request_payload = payload
+        if not timed_out and status_code == BLOCKED_STATUS_CODE and response_payload:
+            waf_fields = {}
+            for match in WAF_FIELD_PATTERN.finditer(response_payload):
+                waf_fields.setdefault(match.group(1), match.group(2))
+            record.transid = waf_fields.get("transid")
+            record.clientip = waf_fields.get("clientip")
+            record.clientport = waf_fields.get("clientport")
+        return record
+
+    @property
+    def local_datetime(self):
+        return datetime.fromtimestamp(self.timestamp)
+
+    def __repr__(self):
+        return f"DeliveryRecord(guid={self.guid!r}, timestamp={self.timestamp!r}, status_code={self.status_code!r})"
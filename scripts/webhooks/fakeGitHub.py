@@ -0,0 +1,728 @@
+"""
+Local stand-in for the parts of the GitHub REST API used by the webhook scripts.
+
+The server implements:
+- org and repo webhooks, with synthetic, paginated deliveries (Link and ETag headers),
+  delivery details and redelivery attempts
+- the Contents API (GET/PUT) and the Git Data API (blobs, trees, commits, refs) on top of an
+  in-memory git object store per repository, so artifact persistence can be exercised offline
+
+Synthetic data is parameterised by delivery count, payload size and injected latency:
+
+    python fakeGitHub.py --port 8080 --deliveries 5000 --payload-size 16384 --latency-ms 50
+    GITHUB_API_URL=http://127.0.0.1:8080 python analyzeWebhookDeliveries.py prod ./artifacts
+
+The server can also record real exchanges into a cassette (JSON lines) while proxying to
+GitHub, and replay a cassette later:
+
+    python fakeGitHub.py --record https://api.github.com --cassette prod.jsonl
+    python fakeGitHub.py --replay prod.jsonl
+
+In-process use (e.g. from benchmarkWebhooks.py) goes through start_server(), which returns
+the running server.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+DEFAULT_BRANCH = "main"
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+DEFAULT_DELIVERY_COUNT = 1000
+DEFAULT_PAYLOAD_SIZE = 8 * 1024
+DEFAULT_HOOK_URLS = [
+    "https://dev-developer.fiserv.com/api/git-webhook",
+    "https://qa-developer.fiserv.com/api/git-webhook",
+    "https://stage-developer.fiserv.com/api/git-webhook",
+    "https://developer.fiserv.com/api/git-webhook"
+]
+FIRST_HOOK_ID = 400000000
+SYNTHETIC_BRANCHES = ["develop", "stage", "main"]
+SYNTHETIC_REPOSITORIES = [f"tenant-repo-{i}" for i in range(18)] + ["adobe-commerce-plugin", "mobile-payments-ios"]
+FIRST_REPOSITORY_ID = 700000000
+# Repo hooks get ids of their own so every repo has its own deliveries
+FIRST_REPOSITORY_HOOK_ID = FIRST_HOOK_ID + 1000
+# Response headers kept in cassettes; everything else (cookies, request ids, ...) is dropped
+CASSETTE_HEADERS = ["Content-Type", "Link", "ETag", "X-RateLimit-Limit", "X-RateLimit-Remaining",
+                    "X-RateLimit-Reset", "Retry-After"]
+
+def git_blob_sha(content):
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+def _object_sha(kind, data):
+    body = json.dumps(data, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(kind.encode("utf-8") + b" %d\0" % len(body) + body).hexdigest()
+
+class FakeRepository:
+    """
+    Flat git object store: trees map full paths to blob shas.
+    """
+
+    def __init__(self):
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.refs = {}
+        self.lock = threading.Lock()
+        empty_tree = self.create_tree({})
+        self.refs[f"heads/{DEFAULT_BRANCH}"] = self.create_commit("Initial commit", empty_tree, [])
+
+    def create_blob(self, content):
+        sha = git_blob_sha(content)
+        self.blobs[sha] = content
+        return sha
+
+    def create_tree(self, entries):
+        sha = _object_sha("tree", entries)
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def create_commit(self, message, tree_sha, parents):
+        sha = _object_sha("commit", {"message": message, "tree": tree_sha, "parents": parents})
+        self.commits[sha] = {"message": message, "tree": tree_sha, "parents": list(parents)}
+        return sha
+
+    def head_tree(self, branch):
+        return self.trees[self.commits[self.refs[f"heads/{branch}"]]["tree"]]
+
+    def files(self, branch=DEFAULT_BRANCH):
+        """
+        Returns {path: content} of the branch head, for assertions in tests and benchmarks.
+        """
+        return {path: self.blobs[sha] for path, sha in self.head_tree(branch).items()}
+
+class SyntheticDeliveries:
+    """
+    Deterministic webhook deliveries of one hook, generated on demand, newest first.
+
+    Every tenth delivery timed out (empty response) and every tenth, offset by five, was blocked
+    by the WAF (status 200 with a WAF page). With `failures`, every tenth delivery, offset by six,
+    got a 502 from the endpoint (repo hooks, as swept by RedeliverWebhooks.py, have failures).
+    With `redelivery_every`, every Nth delivery is a redelivery attempt of the next older one
+    and shares its guid.
+
+    Redeliveries requested through the API are listed as new, newest deliveries. A redelivery
+    of a timed-out delivery times out again on every other attempt, starting with the first
+    attempt for every other group of ten deliveries.
+    """
+
+    def __init__(self, hook_id, count=DEFAULT_DELIVERY_COUNT, payload_size=DEFAULT_PAYLOAD_SIZE,
+                 redelivery_every=0, now=None, failures=False):
+        self.hook_id = hook_id
+        self.failures = failures
+        self.count = count
+        self.payload_size = payload_size
+        self.redelivery_every = redelivery_every
+        self.now = now or datetime.now(timezone.utc).replace(microsecond=0)
+        # Newest delivery has the highest id, like GitHub
+        self.first_id = hook_id * 1000000 + count
+        # Redeliveries requested through the API, oldest first: (id, index, delivered_at, timed_out)
+        self.attempts = []
+        self.lock = threading.Lock()
+
+    @property
+    def total(self):
+        with self.lock:
+            return self.count + len(self.attempts)
+
+    def index_of(self, delivery_id):
+        index = self.first_id - delivery_id
+        return index if 0 <= index < self.count else None
+
+    def _attempt(self, delivery_id):
+        with self.lock:
+            position = delivery_id - self.first_id - 1
+            return self.attempts[position] if 0 <= position < len(self.attempts) else None
+
+    def resolve_index(self, delivery_id):
+        """
+        Returns the index of the synthetic delivery that `delivery_id` is, or is a redelivery of.
+        """
+        attempt = self._attempt(delivery_id)
+        return attempt[1] if attempt else self.index_of(delivery_id)
+
+    def redeliver(self, index):
+        with self.lock:
+            previous_attempts = sum(1 for attempt in self.attempts if attempt[1] == index)
+            timed_out = self._outcome(index) == "timeout" and (index // 10 + previous_attempts) % 2 == 0
+            attempt_id = self.first_id + len(self.attempts) + 1
+            self.attempts.append((attempt_id, index, datetime.now(timezone.utc).replace(microsecond=0), timed_out))
+        return attempt_id
+
+    def _attempt_item(self, attempt_id, index, delivered_at, timed_out):
+        return dict(self.list_item(index), **{
+            "id": attempt_id,
+            "delivered_at": delivered_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "redelivery": True,
+            "duration": 10.0 if timed_out else 0.3,
+            "status": "timed out" if timed_out else "OK",
+            "status_code": 0 if timed_out else 202
+        })
+
+    def _is_redelivery(self, index):
+        return self.redelivery_every > 0 and index % self.redelivery_every == self.redelivery_every - 1 and index + 1 < self.count
+
+    def _guid(self, index):
+        # A redelivery shares the guid of the original (older) delivery
+        if self._is_redelivery(index):
+            index += 1
+        return f"{self.hook_id:08x}-0000-4000-8000-{index:012x}"
+
+    def _outcome(self, index):
+        if index % 10 == 3:
+            return "timeout"
+        if index % 10 == 8:
+            return "blocked"
+        if self.failures and index % 10 == 6:
+            return "error"
+        return "ok"
+
+    def _delivered_at(self, index):
+        return self.now - timedelta(minutes=2 * index)
+
+    def list_item(self, index):
+        outcome = self._outcome(index)
+        repository_index = index % len(SYNTHETIC_REPOSITORIES)
+        return {
+            "id": self.first_id - index,
+            "guid": self._guid(index),
+            "delivered_at": self._delivered_at(index).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "redelivery": self._is_redelivery(index),
+            "duration": 10.0 if outcome == "timeout" else round(0.05 + (index % 37) * 0.04, 2),
+            "status": {"timeout": "timed out", "error": "Invalid HTTP Response: 502"}.get(outcome, "OK"),
+            "status_code": {"timeout": 0, "blocked": 200, "error": 502}.get(outcome, 202),
+            "event": "push" if index % 25 else "ping",
+            "action": None,
+            "installation_id": None,
+            "repository_id": FIRST_REPOSITORY_ID + repository_index
+        }
+
+    def page(self, page, per_page):
+        start = (page - 1) * per_page
+        with self.lock:
+            attempts = list(reversed(self.attempts))
+        items = []
+        for position in range(start, min(start + per_page, self.count + len(attempts))):
+            if position < len(attempts):
+                items.append(self._attempt_item(*attempts[position]))
+            else:
+                items.append(self.list_item(position - len(attempts)))
+        return items
+
+    def detail_by_id(self, delivery_id):
+        attempt = self._attempt(delivery_id)
+        if attempt is None:
+            index = self.index_of(delivery_id)
+            return self.detail(index) if index is not None else None
+        item = self._attempt_item(*attempt)
+        detail = dict(self.detail(attempt[1]), **item)
+        if not attempt[3]:
+            detail["response"] = {"headers": {"Content-Type": "application/json"}, "payload": "{\"status\":\"accepted\"}"}
+        return detail
+
+    def detail(self, index):
+        item = self.list_item(index)
+        outcome = self._outcome(index)
+        repository_index = index % len(SYNTHETIC_REPOSITORIES)
+        repository_name = SYNTHETIC_REPOSITORIES[repository_index]
+        commit_time = self._delivered_at(index) - timedelta(seconds=5)
+        payload = {
+            "ref": f"refs/heads/{SYNTHETIC_BRANCHES[index % len(SYNTHETIC_BRANCHES)]}",
+            "before": f"{index:040x}",
+            "after": f"{index + 1:040x}",
+            "repository": {
+                "id": FIRST_REPOSITORY_ID + repository_index,
+                "name": repository_name,
+                "full_name": f"Fiserv/{repository_name}",
+                "private": True
+            },
+            "head_commit": {
+                "id": f"{index + 1:040x}",
+                "message": f"Synthetic commit {index}",
+                "timestamp": commit_time.isoformat()
+            } if item["event"] == "push" else None,
+            "commits": []
+        }
+        # Pad the payload with commits until it reaches the requested size
+        size = len(json.dumps(payload))
+        commit_number = 0
+        while size < self.payload_size:
+            commit = {
+                "id": f"{index:020x}{commit_number:020x}",
+                "message": "Update documentation " + "x" * 200,
+                "added": [f"docs/page-{commit_number}.md"],
+                "modified": ["config/tenant.json"],
+                "removed": []
+            }
+            payload["commits"].append(commit)
+            size += len(json.dumps(commit)) + 2
+            commit_number += 1
+
+        if outcome == "timeout":
+            response = {"headers": {}, "payload": ""}
+        elif outcome == "blocked":
+            response = {
+                "headers": {"Content-Type": "text/html"},
+                "payload": (f"<html>Request rejected. _event_transid='{index:016x}' "
+                            f"_event_clientip='140.82.{index % 256}.{(index // 256) % 256}' "
+                            f"_event_clientport='{40000 + index % 20000}'</html>")
+            }
+        elif outcome == "error":
+            response = {"headers": {"Content-Type": "text/html"}, "payload": "<html>502 Bad Gateway</html>"}
+        else:
+            response = {"headers": {"Content-Type": "application/json"}, "payload": "{\"status\":\"accepted\"}"}
+
+        return dict(item, **{
+            "url": "",
+            "request": {
+                "headers": {
+                    "X-Github-Delivery": item["guid"],
+                    "X-Github-Event": item["event"],
+                    "X-Hub-Signature-256": "sha256=" + hashlib.sha256(item["guid"].encode("utf-8")).hexdigest()
+                },
+                "payload": payload
+            },
+            "response": response
+        })
+
+class Cassette:
+    """
+    Recorded HTTP exchanges stored as JSON lines, one exchange per line.
+
+    On replay, exchanges are matched on method and path with query string; repeated requests
+    get the recorded responses in order and the last one once they run out.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.exchanges = defaultdict(list)
+        self.upstream = None
+        self._served = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, filepath):
+        cassette = cls(filepath)
+        with open(filepath, "r") as f:
+            for line in f:
+                if line.strip():
+                    exchange = json.loads(line)
+                    cassette.upstream = cassette.upstream or exchange.get("upstream")
+                    cassette.exchanges[(exchange["method"], exchange["path"])].append(exchange)
+        return cassette
+
+    def record(self, upstream, method, path, response):
+        exchange = {
+            "upstream": upstream,
+            "method": method,
+            "path": path,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in CASSETTE_HEADERS if name in response.headers},
+            "body": base64.b64encode(response.content).decode("utf-8")
+        }
+        with self._lock:
+            with open(self.filepath, "a") as f:
+                f.write(json.dumps(exchange) + "\n")
+
+    def match(self, method, path):
+        with self._lock:
+            exchanges = self.exchanges.get((method, path))
+            if not exchanges:
+                return None
+            served = self._served[(method, path)]
+            self._served[(method, path)] += 1
+            return exchanges[min(served, len(exchanges) - 1)]
+
+class FakeGitHubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler_class=None, delivery_count=DEFAULT_DELIVERY_COUNT,
+                 payload_size=DEFAULT_PAYLOAD_SIZE, latency_ms=0, redelivery_every=0,
+                 hook_urls=DEFAULT_HOOK_URLS, record_upstream=None, cassette=None):
+        super().__init__(address, handler_class or FakeGitHubHandler)
+        self.repositories = {}
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = latency_ms / 1000.0
+        self.hook_urls = list(hook_urls)
+        self.delivery_count = delivery_count
+        self.payload_size = payload_size
+        self.redelivery_every = redelivery_every
+        self.deliveries = {}
+        self.redeliveries = []
+        self.record_upstream = record_upstream.rstrip("/") if record_upstream else None
+        self.cassette = cassette
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def repository(self, owner, repo):
+        with self.lock:
+            key = f"{owner}/{repo}"
+            if key not in self.repositories:
+                self.repositories[key] = FakeRepository()
+            return self.repositories[key]
+
+    def hook_deliveries(self, hook_id):
+        with self.lock:
+            if hook_id not in self.deliveries:
+                self.deliveries[hook_id] = SyntheticDeliveries(hook_id, self.delivery_count, self.payload_size,
+                                                               self.redelivery_every,
+                                                               failures=hook_id >= FIRST_REPOSITORY_HOOK_ID)
+            return self.deliveries[hook_id]
+
+    def record_request(self, method, path, body_size=0):
+        with self.lock:
+            self.requests[method] += 1
+            self.requests[f"{method} {_route_name(path)}"] += 1
+            self.bytes_received += body_size
+
+    def record_response(self, body_size):
+        with self.lock:
+            self.bytes_sent += body_size
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_sent = 0
+            self.bytes_received = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests.get("GET", 0) + self.requests.get("POST", 0) + self.requests.get("PUT", 0)
+                            + self.requests.get("PATCH", 0),
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "endpoints": {key: count for key, count in self.requests.items() if " " in key}
+            }
+
+def _route_name(path):
+    # Collapse ids and file names so request counts aggregate per endpoint
+    path = re.sub(r"/contents/.*", "/contents/{path}", path)
+    path = re.sub(r"/(git/(?:blobs|trees|commits))/[0-9a-f]+", r"/\1/{sha}", path)
+    return re.sub(r"/\d+", "/{id}", path)
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        ("GET", r"/(orgs/[^/]+|repos/[^/]+/[^/]+)/hooks", "list_hooks"),
+        ("GET", r"/(orgs/[^/]+|repos/[^/]+/[^/]+)/hooks/(\d+)/deliveries", "list_deliveries"),
+        ("GET", r"/(orgs/[^/]+|repos/[^/]+/[^/]+)/hooks/(\d+)/deliveries/(\d+)", "get_delivery"),
+        ("POST", r"/(orgs/[^/]+|repos/[^/]+/[^/]+)/hooks/(\d+)/deliveries/(\d+)/attempts", "redeliver"),
+        ("GET", r"/orgs/([^/]+)/repos", "list_org_repositories"),
+        ("GET", r"/repos/([^/]+)/([^/]+)", "get_repository"),
+        ("GET", r"/repos/([^/]+)/([^/]+)/contents/(.+)", "get_contents"),
+        ("PUT", r"/repos/([^/]+)/([^/]+)/contents/(.+)", "put_contents"),
+        ("POST", r"/repos/([^/]+)/([^/]+)/git/blobs", "create_blob"),
+        ("POST", r"/repos/([^/]+)/([^/]+)/git/trees", "create_tree"),
+        ("GET", r"/repos/([^/]+)/([^/]+)/git/commits/([0-9a-f]+)", "get_commit"),
+        ("POST", r"/repos/([^/]+)/([^/]+)/git/commits", "create_commit"),
+        ("GET", r"/repos/([^/]+)/([^/]+)/git/ref/(heads/.+)", "get_ref"),
+        ("PATCH", r"/repos/([^/]+)/([^/]+)/git/refs/(heads/.+)", "update_ref"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def dispatch(self, method):
+        url = urlparse(self.path)
+        self.query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        self.server.record_request(method, url.path, len(raw_body))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.record_upstream:
+            self.proxy(method, raw_body)
+            return
+        if self.server.cassette is not None:
+            self.replay(method)
+            return
+        self.body = json.loads(raw_body) if raw_body else {}
+        for route_method, pattern, handler_name in self.ROUTES:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                getattr(self, handler_name)(*match.groups())
+                return
+        self.send_json(404, {"message": "Not Found"})
+
+    def send_json(self, status, data, headers=None):
+        self.send_body(status, json.dumps(data).encode("utf-8"),
+                       dict({"Content-Type": "application/json; charset=utf-8"}, **(headers or {})))
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.record_response(len(body))
+
+    # Record and replay
+
+    def proxy(self, method, raw_body):
+        upstream = self.server.record_upstream
+        headers = {name: value for name, value in self.headers.items()
+                   if name.lower() in ("authorization", "accept", "x-github-api-version", "content-type", "if-none-match")}
+        response = requests.request(method, upstream + self.path, headers=headers, data=raw_body or None, timeout=60)
+        self.server.cassette.record(upstream, method, self.path, response)
+        self.send_body(response.status_code, response.content, self._local_headers(response.headers, upstream))
+
+    def replay(self, method):
+        exchange = self.server.cassette.match(method, self.path)
+        if exchange is None:
+            self.send_json(404, {"message": f"No recorded exchange for {method} {self.path}"})
+            return
+        self.send_body(exchange["status"], base64.b64decode(exchange["body"]),
+                       self._local_headers(exchange["headers"], exchange.get("upstream")))
+
+    def _local_headers(self, headers, upstream):
+        # Point pagination links at this server instead of the recorded upstream
+        local_headers = {name: headers[name] for name in CASSETTE_HEADERS if name in headers}
+        if upstream and "Link" in local_headers:
+            local_headers["Link"] = local_headers["Link"].replace(upstream, self.server.base_url)
+        return local_headers
+
+    # Webhooks
+
+    def list_hooks(self, scope):
+        if scope.startswith("orgs/"):
+            urls = self.server.hook_urls
+            first_id = FIRST_HOOK_ID
+        else:
+            urls = ["https://developer.fiserv.com/api/git-webhook"]
+            repo = scope.rsplit("/", 1)[-1]
+            first_id = FIRST_REPOSITORY_HOOK_ID + (SYNTHETIC_REPOSITORIES.index(repo) if repo in SYNTHETIC_REPOSITORIES else 0)
+        hooks = [
+            {"id": first_id + i, "type": "Organization" if scope.startswith("orgs/") else "Repository",
+             "name": "web", "active": True, "events": ["push"],
+             "config": {"url": url, "content_type": "json", "insecure_ssl": "0"}}
+            for i, url in enumerate(urls)
+        ]
+        self.send_json(200, hooks)
+
+    def list_deliveries(self, scope, hook_id):
+        deliveries = self.server.hook_deliveries(int(hook_id))
+        per_page = min(int(self.query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+        page = int(self.query.get("page", ["1"])[0])
+        body = json.dumps(deliveries.page(page, per_page)).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        headers = {"Content-Type": "application/json; charset=utf-8", "ETag": etag}
+        if page * per_page < deliveries.total:
+            headers["Link"] = f'<{self.server.base_url}/{scope}/hooks/{hook_id}/deliveries?per_page={per_page}&page={page + 1}>; rel="next"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_body(304, b"", {"ETag": etag})
+            return
+        self.send_body(200, body, headers)
+
+    def get_delivery(self, scope, hook_id, delivery_id):
+        deliveries = self.server.hook_deliveries(int(hook_id))
+        detail = deliveries.detail_by_id(int(delivery_id))
+        if detail is None:
+            self.send_json(404, {"message": "Not Found"})
+            return
+        self.send_json(200, detail)
+
+    def redeliver(self, scope, hook_id, delivery_id):
+        deliveries = self.server.hook_deliveries(int(hook_id))
+        index = deliveries.resolve_index(int(delivery_id))
+        if index is None:
+            self.send_json(404, {"message": "Not Found"})
+            return
+        deliveries.redeliver(index)
+        with self.server.lock:
+            self.server.redeliveries.append((int(hook_id), int(delivery_id)))
+        self.send_json(202, {})
+
+    # Repositories
+
+    def list_org_repositories(self, org):
+        per_page = min(int(self.query.get("per_page", [DEFAULT_PER_PAGE])[0]), MAX_PER_PAGE)
+        page = int(self.query.get("page", ["1"])[0])
+        names = SYNTHETIC_REPOSITORIES[(page - 1) * per_page:page * per_page]
+        repos = [{"id": FIRST_REPOSITORY_ID + SYNTHETIC_REPOSITORIES.index(name), "name": name,
+                  "full_name": f"{org}/{name}", "private": True, "archived": name == SYNTHETIC_REPOSITORIES[-1]}
+                 for name in names]
+        headers = {}
+        if page * per_page < len(SYNTHETIC_REPOSITORIES):
+            headers["Link"] = f'<{self.server.base_url}/orgs/{org}/repos?per_page={per_page}&page={page + 1}>; rel="next"'
+        self.send_json(200, repos, headers)
+
+    def get_repository(self, owner, repo):
+        if repo not in SYNTHETIC_REPOSITORIES:
+            self.send_json(404, {"message": "Not Found"})
+            return
+        self.send_json(200, {"id": FIRST_REPOSITORY_ID + SYNTHETIC_REPOSITORIES.index(repo), "name": repo,
+                             "full_name": f"{owner}/{repo}", "private": True})
+
+    # Contents API
+
+    def get_contents(self, owner, repo, path):
+        repository = self.server.repository(owner, repo)
+        branch = self.query.get("ref", [DEFAULT_BRANCH])[0]
+        with repository.lock:
+            sha = repository.head_tree(branch).get(path)
+            content = repository.blobs.get(sha)
+        if sha is None:
+            self.send_json(404, {"message": "Not Found"})
+            return
+        self.send_json(200, {"path": path, "sha": sha, "content": base64.b64encode(content).decode("utf-8")})
+
+    def put_contents(self, owner, repo, path):
+        repository = self.server.repository(owner, repo)
+        branch = self.body.get("branch", DEFAULT_BRANCH)
+        content = base64.b64decode(self.body.get("content", ""))
+        with repository.lock:
+            entries = dict(repository.head_tree(branch))
+            current_sha = entries.get(path)
+            if current_sha is not None and self.body.get("sha") != current_sha:
+                self.send_json(409, {"message": f"{path} does not match {self.body.get('sha')}"})
+                return
+            entries[path] = repository.create_blob(content)
+            parent = repository.refs[f"heads/{branch}"]
+            tree_sha = repository.create_tree(entries)
+            commit_sha = repository.create_commit(self.body.get("message", ""), tree_sha, [parent])
+            repository.refs[f"heads/{branch}"] = commit_sha
+        self.send_json(200 if current_sha else 201,
+                       {"content": {"path": path, "sha": entries[path]}, "commit": {"sha": commit_sha}})
+
+    # Git Data API
+
+    def create_blob(self, owner, repo):
+        repository = self.server.repository(owner, repo)
+        if self.body.get("encoding") == "base64":
+            content = base64.b64decode(self.body.get("content", ""))
+        else:
+            content = self.body.get("content", "").encode("utf-8")
+        with repository.lock:
+            sha = repository.create_blob(content)
+        self.send_json(201, {"sha": sha})
+
+    def create_tree(self, owner, repo):
+        repository = self.server.repository(owner, repo)
+        with repository.lock:
+            entries = dict(repository.trees.get(self.body.get("base_tree"), {}))
+            for entry in self.body.get("tree", []):
+                if entry.get("sha") is None:
+                    entries.pop(entry["path"], None)
+                elif entry["sha"] not in repository.blobs:
+                    self.send_json(422, {"message": f"Unknown blob {entry['sha']}"})
+                    return
+                else:
+                    entries[entry["path"]] = entry["sha"]
+            sha = repository.create_tree(entries)
+        self.send_json(201, {"sha": sha})
+
+    def get_commit(self, owner, repo, sha):
+        repository = self.server.repository(owner, repo)
+        commit = repository.commits.get(sha)
+        if commit is None:
+            self.send_json(404, {"message": "Not Found"})
+            return
+        self.send_json(200, {"sha": sha, "message": commit["message"], "tree": {"sha": commit["tree"]},
+                             "parents": [{"sha": parent} for parent in commit["parents"]]})
+
+    def create_commit(self, owner, repo):
+        repository = self.server.repository(owner, repo)
+        with repository.lock:
+            if self.body.get("tree") not in repository.trees:
+                self.send_json(422, {"message": "Unknown tree"})
+                return
+            sha = repository.create_commit(self.body.get("message", ""), self.body["tree"], self.body.get("parents", []))
+        self.send_json(201, {"sha": sha})
+
+    def get_ref(self, owner, repo, ref):
+        repository = self.server.repository(owner, repo)
+        sha = repository.refs.get(ref)
+        if sha is None:
+            self.send_json(404, {"message": "Not Found"})
+            return
+        self.send_json(200, {"ref": f"refs/{ref}", "object": {"type": "commit", "sha": sha}})
+
+    def update_ref(self, owner, repo, ref):
+        repository = self.server.repository(owner, repo)
+        new_sha = self.body.get("sha")
+        with repository.lock:
+            current_sha = repository.refs.get(ref)
+            commit = repository.commits.get(new_sha)
+            if commit is None:
+                self.send_json(422, {"message": "Object does not exist"})
+                return
+            if current_sha not in commit["parents"] and not self.body.get("force"):
+                self.send_json(422, {"message": "Update is not a fast forward"})
+                return
+            repository.refs[ref] = new_sha
+        self.send_json(200, {"ref": f"refs/{ref}", "object": {"type": "commit", "sha": new_sha}})
+
+def start_server(host="127.0.0.1", port=0, server_class=FakeGitHubServer, **options):
+    """
+    Starts a server on a background thread and returns it; stop it with server.shutdown().
+    `options` are passed to the server (delivery_count, payload_size, latency_ms, ...).
+    """
+    server = server_class((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the GitHub REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--deliveries", type=int, default=DEFAULT_DELIVERY_COUNT, help="Synthetic deliveries per hook")
+    parser.add_argument("--payload-size", type=int, default=DEFAULT_PAYLOAD_SIZE,
+                        help="Approximate size in bytes of each synthetic push payload")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latency injected into every response")
+    parser.add_argument("--redelivery-every", type=int, default=0,
+                        help="Make every Nth synthetic delivery a redelivery of the next older one")
+    parser.add_argument("--record", metavar="UPSTREAM", help="Proxy every request to UPSTREAM and record it into --cassette")
+    parser.add_argument("--replay", metavar="CASSETTE", help="Serve the exchanges recorded in CASSETTE")
+    parser.add_argument("--cassette", help="Cassette file written by --record")
+    args = parser.parse_args()
+    if args.record and not args.cassette:
+        parser.error("--record requires --cassette")
+
+    cassette = None
+    if args.replay:
+        cassette = Cassette.load(args.replay)
+    elif args.record:
+        cassette = Cassette(args.cassette)
+    server = FakeGitHubServer((args.host, args.port), delivery_count=args.deliveries, payload_size=args.payload_size,
+                              latency_ms=args.latency_ms, redelivery_every=args.redelivery_every,
+                              record_upstream=args.record, cassette=cassette)
+    print(f"Fake GitHub API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import base64
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_BLOB_CONCURRENCY = 8
+# Attempts to advance the branch when another run moved it between reading and updating the ref
+MAX_REF_UPDATE_ATTEMPTS = 3
+
+class GitDataPersistenceError(Exception):
+    pass
+
+def commit_files(client, repo_api_url, files, message, branch="main", repo_path_name="artifacts",
+                 concurrency=DEFAULT_BLOB_CONCURRENCY):
+    """
+    Commits `files` (local paths) to `branch` as a single commit through the Git Data API.
+
+    Blobs are created concurrently, then one tree (on top of the branch head tree), one commit,
+    and a single fast-forward update of the branch ref. If the branch moved in the meantime
+    the tree and commit are rebuilt on the new head; the blobs are reused.
+    Returns the sha of the new commit.
+    """
+    files = sorted(files)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        blob_shas = list(executor.map(lambda file: _create_blob(client, repo_api_url, file), files))
+
+    tree_entries = [
+        {
+            "path": f"{repo_path_name}/{os.path.basename(file)}",
+            "mode": "100644",
+            "type": "blob",
+            "sha": blob_sha
+        }
+        for file, blob_sha in zip(files, blob_shas)
+    ]
+
+    for _ in range(MAX_REF_UPDATE_ATTEMPTS):
+        head_sha = _request(client, "get", f"{repo_api_url}/git/ref/heads/{branch}")["object"]["sha"]
+        base_tree_sha = _request(client, "get", f"{repo_api_url}/git/commits/{head_sha}")["tree"]["sha"]
+        tree_sha = _request(client, "post", f"{repo_api_url}/git/trees",
+                            {"base_tree": base_tree_sha, "tree": tree_entries})["sha"]
+        commit_sha = _request(client, "post", f"{repo_api_url}/git/commits",
+                              {"message": message, "tree": tree_sha, "parents": [head_sha]})["sha"]
+        response = client.patch(f"{repo_api_url}/git/refs/heads/{branch}", json={"sha": commit_sha, "force": False})
+        if response.status_code == 200:
+            return commit_sha
+        if response.status_code != 422:
+            raise GitDataPersistenceError(f"Failed to update {branch}: {response.status_code} {response.text}")
+        print(f"{branch} moved while committing, retrying on the new head")
+
+    raise GitDataPersistenceError(f"Failed to update {branch} after {MAX_REF_UPDATE_ATTEMPTS} attempts")
+
+def _create_blob(client, repo_api_url, file):
+    with open(file, "rb") as f:
+        content_b64 = base64.b64encode(f.read()).decode("utf-8")
+    return _request(client, "post", f"{repo_api_url}/git/blobs", {"content": content_b64, "encoding": "base64"})["sha"]
+
+def _request(client, method, url, payload=None):
+    # Git objects are content-addressed, so creating one again after a lost response is harmless
+    response = client.request(method, url, json=payload, retry=True)
+    if response.status_code not in (200, 201):
+        raise GitDataPersistenceError(f"{method.upper()} {url} failed: {response.status_code} {response.text}")
+    return response.json()
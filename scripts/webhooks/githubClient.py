@@ -0,0 +1,263 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_API_VERSION = "2022-11-28"
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_TIMEOUT_SECONDS = 30
+# Requests kept in reserve; below this the client waits for the rate limit window to reset
+DEFAULT_RATE_LIMIT_RESERVE = 50
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# Longest single wait for the rate limit; well below the 15 minute job timeout so a run can still persist
+MAX_RATE_LIMIT_WAIT_SECONDS = 5 * 60
+ETAG_CACHE_SIZE = 256
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+# Methods retried after a connection error, timeout or 5xx; other methods only on an explicit retry=True
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"}
+
+class GitHubApiError(Exception):
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+        self.status_code = response.status_code if response is not None else None
+
+class GitHubClient:
+    """
+    GitHub REST API client shared by the webhook scripts.
+
+    All requests go through one pooled keep-alive session. The client tracks the
+    X-RateLimit-* headers of every response and waits for the window to reset once the
+    remaining budget drops to `rate_limit_reserve`. Primary/secondary rate limit responses
+    (403/429) are retried with jittered exponential backoff, honouring Retry-After and
+    X-RateLimit-Reset. 5xx responses, connection errors and timeouts are retried only for
+    idempotent methods: a POST such as a redelivery may have been carried out by GitHub even
+    though its response was lost, so it is retried only when the caller passes `retry=True`.
+    Rate limit waits are capped, and never extend past the monotonic `deadline` if one is
+    given, so that a run is not killed by its job timeout while waiting. GET requests made with
+    `conditional=True` send the ETag of the previous response as If-None-Match, so unchanged
+    pages come back as 304s that do not count against the rate limit; the cached response is
+    returned in that case.
+
+    The client exposes get/post/put/patch/request like a requests Session. `on_response`, if
+    given, is called with every response received (including retried ones) and its latency
+    in seconds.
+    """
+
+    def __init__(self, token=None, base_url=GITHUB_API_URL, pool_size=DEFAULT_POOL_SIZE,
+                 max_retries=DEFAULT_MAX_RETRIES, rate_limit_reserve=DEFAULT_RATE_LIMIT_RESERVE,
+                 timeout=DEFAULT_TIMEOUT_SECONDS, sleep=time.sleep, on_response=None, deadline=None):
+        self.base_url = base_url.rstrip("/")
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.rate_limit_reserve = rate_limit_reserve
+        self.timeout = timeout
+        self.sleep = sleep
+        self.on_response = on_response
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": GITHUB_API_VERSION
+        })
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.requests_made = 0
+        self.retries = 0
+        self.not_modified = 0
+        self.bytes_received = 0
+        self.rate_limit_limit = None
+        self.rate_limit_remaining = None
+        self.rate_limit_reset = None
+        self._etags = OrderedDict()
+        self._lock = threading.Lock()
+
+    def url(self, path):
+        return path if path.startswith("http") else f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, url, conditional=False, **kwargs):
+        return self.request("GET", url, conditional=conditional, **kwargs)
+
+    def post(self, url, retry=False, **kwargs):
+        return self.request("POST", url, retry=retry, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def request(self, method, url, conditional=False, retry=None, **kwargs):
+        """
+        Sends a request, retrying it as described on the class. `retry` overrides whether
+        connection errors, timeouts and 5xx responses are retried; by default only requests
+        with an idempotent method are.
+        """
+        method = method.upper()
+        url = self.url(url)
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        cached = None
+        if conditional and method == "GET":
+            with self._lock:
+                cached = self._etags.get(url)
+            if cached is not None:
+                headers = dict(kwargs.pop("headers", None) or {})
+                headers["If-None-Match"] = cached.headers["ETag"]
+                kwargs["headers"] = headers
+
+        attempt = 0
+        while True:
+            self._wait_for_budget()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not retry or attempt >= self.max_retries:
+                    raise
+                self._count_retry()
+                self.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            self._record(response)
+            if self.on_response:
+                self.on_response(response, time.perf_counter() - start)
+            delay = self._retry_delay(response, attempt, retry)
+            if delay is None:
+                break
+            self._count_retry()
+            self.sleep(delay)
+            attempt += 1
+
+        if response.status_code == 304 and cached is not None:
+            with self._lock:
+                self.not_modified += 1
+                self._etags.move_to_end(url)
+            return cached
+        if conditional and method == "GET" and response.status_code == 200 and response.headers.get("ETag"):
+            with self._lock:
+                self._etags[url] = response
+                self._etags.move_to_end(url)
+                while len(self._etags) > ETAG_CACHE_SIZE:
+                    self._etags.popitem(last=False)
+        return response
+
+    def get_json(self, url, conditional=False, **kwargs):
+        """
+        GETs `url` and returns the decoded JSON body, raising GitHubApiError on non-2xx responses.
+        """
+        response = self.get(url, conditional=conditional, **kwargs)
+        if not response.ok:
+            raise GitHubApiError(f"GET {self.url(url)} failed: {response.status_code} {response.text[:200]}", response)
+        return response.json()
+
+    def paginate(self, url, params=None, conditional=False):
+        """
+        Yields the decoded JSON body of every page, following the `next` links.
+        """
+        next_url = self.url(url)
+        while next_url:
+            response = self.get(next_url, conditional=conditional, params=params)
+            if not response.ok:
+                raise GitHubApiError(f"GET {next_url} failed: {response.status_code} {response.text[:200]}", response)
+            yield response.json()
+            next_url = response.links.get("next", {}).get("url")
+            # The next link already carries the query string
+            params = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests_made,
+                "retries": self.retries,
+                "not_modified": self.not_modified,
+                "bytes_received": self.bytes_received,
+                "rate_limit_limit": self.rate_limit_limit,
+                "rate_limit_remaining": self.rate_limit_remaining,
+                "rate_limit_reset": self.rate_limit_reset
+            }
+
+    def _count_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def _record(self, response):
+        with self._lock:
+            self.requests_made += 1
+            self.bytes_received += len(response.content or b"")
+            headers = response.headers
+            if "X-RateLimit-Remaining" in headers:
+                try:
+                    self.rate_limit_remaining = int(headers["X-RateLimit-Remaining"])
+                    self.rate_limit_limit = int(headers.get("X-RateLimit-Limit", self.rate_limit_limit or 0))
+                    self.rate_limit_reset = int(headers.get("X-RateLimit-Reset", self.rate_limit_reset or 0))
+                except ValueError:
+                    pass
+
+    def _wait_for_budget(self):
+        with self._lock:
+            remaining = self.rate_limit_remaining
+            reset = self.rate_limit_reset
+            if remaining is not None and remaining <= self.rate_limit_reserve:
+                # Only one thread waits for a window; the others see the refreshed budget afterwards
+                self.rate_limit_remaining = None
+        if remaining is None or remaining > self.rate_limit_reserve or not reset:
+            return
+        wait = self._cap_wait(reset - time.time() + 1)
+        if wait > 0:
+            print(f"GitHub rate limit budget low ({remaining} remaining), waiting {wait:.0f}s for reset")
+            self.sleep(wait)
+
+    def _cap_wait(self, wait):
+        """
+        Limits a rate limit wait to MAX_RATE_LIMIT_WAIT_SECONDS and to the time left before the deadline.
+        """
+        wait = min(wait, MAX_RATE_LIMIT_WAIT_SECONDS)
+        if self.deadline is not None:
+            wait = min(wait, self.deadline - time.monotonic())
+        return max(wait, 0)
+
+    def _retry_delay(self, response, attempt, retry=True):
+        """
+        Returns how long to wait before retrying `response`, or None if it should not be retried.
+        A rate limited request was not carried out, so it is retried whatever the method.
+        """
+        if attempt >= self.max_retries:
+            return None
+        status = response.status_code
+        rate_limited = status == 429 or (status == 403 and (
+            "Retry-After" in response.headers
+            or response.headers.get("X-RateLimit-Remaining") == "0"
+            or "rate limit" in response.text.lower()))
+        if not rate_limited and not (retry and status in RETRY_STATUS_CODES):
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            wait = float(retry_after)
+        elif rate_limited and response.headers.get("X-RateLimit-Remaining") == "0" \
+                and response.headers.get("X-RateLimit-Reset", "").isdigit():
+            wait = max(int(response.headers["X-RateLimit-Reset"]) - time.time(), 0) + 1
+        else:
+            return self._backoff(attempt)
+        capped = self._cap_wait(wait)
+        if capped < wait and self.deadline is not None:
+            # Waiting would run past the deadline; give the response back instead
+            return None
+        return capped
+
+    def _backoff(self, attempt):
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
@@ -0,0 +1,130 @@
+import json
+import time
+from datetime import datetime
+
+from deliveryRecord import DELIVERY_RETENTION_SECONDS
+
+DELIVERY_CURSOR_FILENAME = "delivery_cursor"
+SEEN_DELIVERIES_FILENAME = "seen_deliveries"
+# GUIDs are evicted from the seen index once GitHub no longer lists their deliveries
+SEEN_DELIVERIES_RETENTION_SECONDS = DELIVERY_RETENTION_SECONDS
+
+def get_delivery_cursor_filepath(artifacts_path, env):
+    return f"{artifacts_path}/{DELIVERY_CURSOR_FILENAME}_{env}.json"
+
+def get_seen_deliveries_filepath(artifacts_path, env):
+    return f"{artifacts_path}/{SEEN_DELIVERIES_FILENAME}_{env}.json"
+
+def delivered_at_epoch(delivery):
+    """
+    Returns the epoch of the list-level `delivered_at` field of a delivery, or None if missing/invalid.
+    """
+    delivered_at = delivery.get("delivered_at")
+    if not delivered_at:
+        return None
+    try:
+        return datetime.fromisoformat(delivered_at.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+class IncrementalState:
+    """
+    Resume cursor and seen-GUID index used to make analysis runs incremental.
+
+    Deliveries are listed newest first with increasing list ids, so once a page contains the
+    id recorded by the previous run every later page is already processed and paging can stop.
+    The seen index (GUID -> delivered_at epoch) lets detail fetches be skipped for deliveries
+    above the cursor that were already handled, e.g. when the previous run did not finish.
+    A delivery is only marked seen once its details were processed; the cursor is never
+    advanced past a delivery whose details could not be fetched, so a later run retries it.
+    """
+
+    def __init__(self, cursor_filepath, seen_filepath, retention_seconds=SEEN_DELIVERIES_RETENTION_SECONDS):
+        self.cursor_filepath = cursor_filepath
+        self.seen_filepath = seen_filepath
+        self.retention_seconds = retention_seconds
+        self.last_delivery_id = None
+        self.newest_delivery_id = None
+        self.oldest_failed_delivery_id = None
+        self.seen = {}
+        self.skipped = 0
+
+    @classmethod
+    def load(cls, artifacts_path, env, retention_seconds=SEEN_DELIVERIES_RETENTION_SECONDS):
+        state = cls(get_delivery_cursor_filepath(artifacts_path, env),
+                    get_seen_deliveries_filepath(artifacts_path, env),
+                    retention_seconds)
+        cursor = _read_json(state.cursor_filepath, {})
+        state.last_delivery_id = cursor.get("last_delivery_id")
+        seen = _read_json(state.seen_filepath, {})
+        if isinstance(seen, dict):
+            state.seen = {guid: float(ts) for guid, ts in seen.items() if isinstance(ts, (int, float))}
+        state.evict()
+        return state
+
+    def reached_cursor(self, delivery):
+        """
+        True if the delivery was listed at or before the cursor of the previous run.
+        """
+        delivery_id = delivery.get("id")
+        return self.last_delivery_id is not None and delivery_id is not None and delivery_id <= self.last_delivery_id
+
+    def needs_details(self, delivery):
+        """
+        True if the delivery is newer than the cursor and its GUID has not been seen yet.
+        """
+        if self.reached_cursor(delivery) or delivery.get("guid") in self.seen:
+            self.skipped += 1
+            return False
+        return True
+
+    def observe(self, delivery):
+        """
+        Advances the candidate cursor to a listed delivery.
+        """
+        delivery_id = delivery.get("id")
+        if delivery_id is not None and (self.newest_delivery_id is None or delivery_id > self.newest_delivery_id):
+            self.newest_delivery_id = delivery_id
+
+    def mark_seen(self, delivery):
+        """
+        Records a delivery whose details were processed, or that needs no details, as seen.
+        """
+        guid = delivery.get("guid")
+        if guid:
+            self.seen[guid] = delivered_at_epoch(delivery) or time.time()
+
+    def mark_failed(self, delivery):
+        """
+        Records a delivery whose details could not be fetched; the cursor stays below it.
+        """
+        delivery_id = delivery.get("id")
+        if delivery_id is not None and (self.oldest_failed_delivery_id is None or delivery_id < self.oldest_failed_delivery_id):
+            self.oldest_failed_delivery_id = delivery_id
+
+    def evict(self, now=None):
+        cutoff = (now if now is not None else time.time()) - self.retention_seconds
+        self.seen = {guid: ts for guid, ts in self.seen.items() if ts >= cutoff}
+
+    def save(self, writer, advance_cursor=True):
+        """
+        Writes the cursor and seen index with `writer(filepath, content)`, advancing the cursor
+        only if this run listed newer deliveries and `advance_cursor` is set.
+        """
+        self.evict()
+        last_delivery_id = self.last_delivery_id
+        newest_delivery_id = self.newest_delivery_id
+        if newest_delivery_id is not None and self.oldest_failed_delivery_id is not None:
+            newest_delivery_id = min(newest_delivery_id, self.oldest_failed_delivery_id - 1)
+        if advance_cursor and newest_delivery_id is not None and (last_delivery_id is None or newest_delivery_id > last_delivery_id):
+            last_delivery_id = newest_delivery_id
+        writer(self.cursor_filepath, json.dumps({"last_delivery_id": last_delivery_id}, indent=4))
+        writer(self.seen_filepath, json.dumps(self.seen, separators=(",", ":"), sort_keys=True))
+        self.last_delivery_id = last_delivery_id
+
+def _read_json(filepath, default):
+    try:
+        with open(filepath, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
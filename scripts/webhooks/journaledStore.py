@@ -0,0 +1,115 @@
+import json
+import os
+
+JOURNAL_EXTENSION = ".jsonl"
+
+class JournaledJsonStore:
+    """
+    In-memory store of JSON entries for one run, indexed by their `key_field`, backed by one JSON artifact.
+
+    Existing entries are loaded once from the artifact. New and updated entries are appended to
+    a JSON-lines journal next to it as they change, so a crashed run loses nothing, and the
+    artifact is written once by export() at the end of the run. The journal is removed after a
+    successful export. By default the artifact is a JSON array of the entries; a store with
+    another layout overrides _load() and _document().
+    """
+    key_field = None
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.journal_filepath = os.path.splitext(filepath)[0] + JOURNAL_EXTENSION
+        self.entries = {}
+        self.dirty = False
+        self._journal = None
+
+    @classmethod
+    def open(cls, filepath, *args, **kwargs):
+        store = cls(filepath, *args, **kwargs)
+        try:
+            with open(filepath, "r") as f:
+                store._load(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        # Replay entries journaled by a run that did not get to export them
+        try:
+            with open(store.journal_filepath, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    store.entries[entry.get(cls.key_field)] = entry
+                    store.dirty = True
+        except FileNotFoundError:
+            pass
+        return store
+
+    def _load(self, data):
+        """
+        Adds the entries of the decoded artifact `data`, a JSON array of entries.
+        """
+        if isinstance(data, list):
+            for entry in data:
+                self.entries.setdefault(entry.get(self.key_field), entry)
+
+    def _document(self):
+        """
+        Returns the content of the artifact, the entries as a JSON array.
+        """
+        return json.dumps(list(self.entries.values()), indent=4)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def _add(self, entry):
+        """
+        Adds an entry unless its key is already stored. Returns True if it was added.
+        """
+        key = entry.get(self.key_field)
+        if key in self.entries:
+            return False
+        self.entries[key] = entry
+        self._append_journal(entry)
+        self.dirty = True
+        return True
+
+    def update(self, key, fields):
+        """
+        Merges `fields` into the stored entry of `key` and journals the updated entry.
+        Returns False if no entry is stored for it.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        entry.update(fields)
+        self._append_journal(entry)
+        self.dirty = True
+        return True
+
+    def _append_journal(self, entry):
+        if self._journal is None:
+            self._journal = open(self.journal_filepath, "a")
+        self._journal.write(json.dumps(entry) + "\n")
+        self._journal.flush()
+
+    def export(self, writer):
+        """
+        Writes the artifact with `writer(filepath, content)` if anything changed.
+        Returns True if the artifact was written.
+        """
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if not self.dirty:
+            return False
+        writer(self.filepath, self._document())
+        self.dirty = False
+        if os.path.exists(self.journal_filepath):
+            os.remove(self.journal_filepath)
+        return True
@@ -0,0 +1,271 @@
+import json
+import math
+from datetime import datetime, timedelta, timezone
+
+from incrementalState import delivered_at_epoch
+from deliveryRecord import attempt_outcome, TIMED_OUT, FAILED
+
+LATENCY_SKETCHES_FILENAME = "latency_sketches"
+LATENCY_REPORT_FILENAME = "latency_report"
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Bins kept per sketch; past this the lowest bins are collapsed, so only low quantiles lose accuracy
+DEFAULT_MAX_BINS = 1024
+# Durations below this (seconds) are counted in the zero bin
+MIN_INDEXABLE_DURATION = 1e-3
+DEFAULT_RETENTION_HOURS = 90 * 24
+DEFAULT_REPORT_HOURS = 48
+# Delivery id ranges remembered as folded into the sketches; older ranges are long gone from GitHub
+MAX_FOLDED_RANGES = 50
+QUANTILES = [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]
+HOUR_FORMAT = "%Y-%m-%dT%H:00Z"
+
+class LatencySketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    A value x is counted in bin ceil(log_gamma(x)) with gamma = (1 + a) / (1 - a), so every
+    quantile is returned within relative accuracy `a` of the exact one. Sketches with the same
+    accuracy merge exactly by adding their bin counts, which is what lets hourly sketches be
+    combined across runs, hours and environments.
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_bins=DEFAULT_MAX_BINS):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        if value > MIN_INDEXABLE_DURATION:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.sum += value * weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def _collapse(self):
+        indexes = sorted(self.bins)
+        excess = len(indexes) - self.max_bins
+        collapsed = sum(self.bins.pop(index) for index in indexes[:excess + 1])
+        self.bins[indexes[excess]] = collapsed
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Midpoint of the bin, within the relative accuracy of every value in it
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "zero_count": self.zero_count,
+            "bins": {str(index): count for index, count in sorted(self.bins.items())}
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_bins=DEFAULT_MAX_BINS):
+        sketch = cls(data.get("relative_accuracy", DEFAULT_RELATIVE_ACCURACY), max_bins)
+        sketch.bins = {int(index): count for index, count in data.get("bins", {}).items()}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
+
+class HourlyLatency:
+    """
+    Deliveries of one hour: a duration sketch plus counts of timeouts and error responses,
+    classified by attempt_outcome like the analysis outcomes (so 5xx responses count as timeouts).
+    """
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.sketch = LatencySketch(relative_accuracy)
+        self.timeouts = 0
+        self.errors = 0
+
+    def observe(self, duration, status_code):
+        self.sketch.add(duration)
+        outcome = attempt_outcome(status_code)
+        if outcome == TIMED_OUT:
+            self.timeouts += 1
+        elif outcome == FAILED:
+            self.errors += 1
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        self.timeouts += other.timeouts
+        self.errors += other.errors
+        return self
+
+    def summary(self, hours=1):
+        count = self.sketch.count
+        summary = {"count": count, "timeouts": self.timeouts, "errors": self.errors,
+                   "timeout_rate": round(self.timeouts / count, 4) if count else None,
+                   "throughput_per_minute": round(count / (hours * 60), 3)}
+        for name, q in QUANTILES:
+            value = self.sketch.quantile(q)
+            summary[f"{name}_seconds"] = round(value, 3) if value is not None else None
+        summary["mean_seconds"] = round(self.sketch.sum / count, 3) if count else None
+        summary["max_seconds"] = self.sketch.max
+        return summary
+
+    def to_dict(self):
+        return {"timeouts": self.timeouts, "errors": self.errors, "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        hourly = cls()
+        hourly.sketch = LatencySketch.from_dict(data.get("sketch", {}))
+        hourly.timeouts = data.get("timeouts", 0)
+        hourly.errors = data.get("errors", 0)
+        return hourly
+
+def get_latency_sketches_filepath(artifacts_path, env):
+    return f"{artifacts_path}/{LATENCY_SKETCHES_FILENAME}_{env}.json"
+
+class LatencyAnalytics:
+    """
+    Hourly latency sketches of a webhook's deliveries, built from the `duration` and
+    `status_code` fields of the deliveries list and persisted across runs.
+
+    Every attempt listed (redeliveries included) is folded into the sketch of the hour it was
+    delivered in, timeouts with their duration. The delivery id ranges already folded are saved
+    with the sketches, so deliveries listed again by a later run are not counted twice and the
+    sketches of successive runs merge into one history. Hours older than `retention_hours` are dropped.
+    """
+
+    def __init__(self, filepath, env, retention_hours=DEFAULT_RETENTION_HOURS):
+        self.filepath = filepath
+        self.env = env
+        self.retention_hours = retention_hours
+        self.hours = {}
+        self.folded_ranges = []
+        self.observed = 0
+        self.skipped = 0
+        self._run_range = None
+
+    @classmethod
+    def load(cls, artifacts_path, env, retention_hours=DEFAULT_RETENTION_HOURS):
+        analytics = cls(get_latency_sketches_filepath(artifacts_path, env), env, retention_hours)
+        try:
+            with open(analytics.filepath, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return analytics
+        analytics.hours = {hour: HourlyLatency.from_dict(hourly) for hour, hourly in data.get("hours", {}).items()}
+        analytics.folded_ranges = [tuple(folded) for folded in data.get("folded_ranges", [])]
+        return analytics
+
+    def _folded(self, delivery_id):
+        return any(low <= delivery_id <= high for low, high in self.folded_ranges)
+
+    def observe_page(self, deliveries):
+        """
+        Folds the listed deliveries of one page into the hourly sketches.
+        """
+        for delivery in deliveries:
+            delivery_id = delivery.get("id")
+            if delivery_id is None:
+                continue
+            low, high = self._run_range or (delivery_id, delivery_id)
+            self._run_range = (min(low, delivery_id), max(high, delivery_id))
+            if self._folded(delivery_id):
+                self.skipped += 1
+                continue
+            delivered_at = delivered_at_epoch(delivery)
+            duration = delivery.get("duration")
+            if delivered_at is None or duration is None:
+                continue
+            hour = datetime.fromtimestamp(delivered_at, timezone.utc).strftime(HOUR_FORMAT)
+            hourly = self.hours.get(hour)
+            if hourly is None:
+                hourly = self.hours[hour] = HourlyLatency()
+            hourly.observe(float(duration), delivery.get("status_code") or 0)
+            self.observed += 1
+
+    def finish(self, now=None):
+        """
+        Records the delivery ids listed by this run as folded and drops expired hours.
+        The deliveries of a run are listed contiguously, so they form a single id range.
+        """
+        if self._run_range:
+            ranges = sorted(self.folded_ranges + [self._run_range])
+            merged = [ranges[0]]
+            for low, high in ranges[1:]:
+                if low <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+                else:
+                    merged.append((low, high))
+            self.folded_ranges = merged[-MAX_FOLDED_RANGES:]
+            self._run_range = None
+        now = now or datetime.now(timezone.utc)
+        oldest = (now - timedelta(hours=self.retention_hours)).strftime(HOUR_FORMAT)
+        self.hours = {hour: hourly for hour, hourly in self.hours.items() if hour >= oldest}
+
+    def to_json(self):
+        return json.dumps({
+            "env": self.env,
+            "folded_ranges": [list(folded) for folded in self.folded_ranges],
+            "hours": {hour: self.hours[hour].to_dict() for hour in sorted(self.hours)}
+        }, indent=4)
+
+    def report(self, report_hours=DEFAULT_REPORT_HOURS, now=None):
+        """
+        Returns per-hour and overall latency, timeout rate and throughput of the last `report_hours` hours.
+        """
+        now = now or datetime.now(timezone.utc)
+        oldest = (now - timedelta(hours=report_hours - 1)).strftime(HOUR_FORMAT)
+        hours = [hour for hour in sorted(self.hours) if hour >= oldest]
+        total = HourlyLatency()
+        for hour in hours:
+            total.merge(self.hours[hour])
+        return {
+            "env": self.env,
+            "generated_at": now.isoformat(),
+            "relative_accuracy": DEFAULT_RELATIVE_ACCURACY,
+            "window_hours": report_hours,
+            # Throughput is averaged over the whole window, hours without deliveries included
+            "total": total.summary(hours=report_hours),
+            "hours": [dict(hour=hour, **self.hours[hour].summary()) for hour in hours]
+        }
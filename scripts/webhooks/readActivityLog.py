@@ -0,0 +1,40 @@
+"""
+Prints an activity log from its gzip-compressed segments.
+
+Activity logs are written as segments, `activity_log_<date>_<env>.<n>.log.gz`, plus the
+segment still open while a run is logging, `activity_log_<date>_<env>.<n>.log`. This prints
+the segments of a day and environment in order, decompressed, as one log:
+
+    python readActivityLog.py ../../artifacts prod
+    python readActivityLog.py ../../artifacts prod --date 10-18-2026 | grep "Total"
+
+Logs written as a single `activity_log_<date>_<env>.log` file are printed as they are.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+import activityLog
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the activity log of an environment from its segments")
+    parser.add_argument("artifacts_path", help="Directory holding the activity log segments")
+    parser.add_argument("env", help="Environment of the activity log, e.g. prod")
+    parser.add_argument("--date", default=datetime.now().strftime("%m-%d-%Y"),
+                        help="Day of the activity log as MM-DD-YYYY (default: today)")
+    args = parser.parse_args()
+
+    filepath = os.path.join(args.artifacts_path, f"activity_log_{args.date}_{args.env}.log")
+    if not os.path.exists(filepath) and not activityLog.list_segments(filepath):
+        print(f"No activity log for {args.env} on {args.date} in {args.artifacts_path}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        for line in activityLog.iter_lines(filepath):
+            sys.stdout.write(line)
+    except BrokenPipeError:
+        # The output was piped into a command that stopped reading, e.g. head
+        sys.stderr.close()
+
+if __name__ == "__main__":
+    main()
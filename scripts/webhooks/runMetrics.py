@@ -0,0 +1,204 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+RUN_METRICS_FILENAME = "run_metrics"
+PROMETHEUS_TEXTFILE_NAME = "webhook_analysis.prom"
+PHASES = ["hook_discovery", "list_pagination", "detail_fetch", "classification", "redelivery", "persistence"]
+# Requests made outside any phase are still counted
+OTHER_PHASE = "other"
+# Phases shared by all environments of a run (e.g. hook discovery) are reported under this label
+SHARED_ENV = "shared"
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = "webhook_analysis"
+
+class PhaseMetrics:
+    """
+    Time spent in a phase and the GitHub API requests made during it.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.requests = 0
+        self.rate_limit_used = 0
+        self.bytes_received = 0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+    def observe_request(self, status_code, elapsed, bytes_received):
+        self.requests += 1
+        # Conditional requests answered with 304 do not count against the primary rate limit
+        if status_code != 304:
+            self.rate_limit_used += 1
+        self.bytes_received += bytes_received
+        self.latency_sum += elapsed
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.latency_counts[i] += 1
+                return
+        self.latency_counts[-1] += 1
+
+    def cumulative_latency_counts(self):
+        counts = []
+        total = 0
+        for count in self.latency_counts:
+            total += count
+            counts.append(total)
+        return counts
+
+    def to_dict(self):
+        cumulative = self.cumulative_latency_counts()
+        return {
+            "seconds": round(self.seconds, 3),
+            "calls": self.calls,
+            "requests": self.requests,
+            "rate_limit_used": self.rate_limit_used,
+            "bytes_received": self.bytes_received,
+            "latency_seconds": {
+                "buckets": {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), cumulative)},
+                "sum": round(self.latency_sum, 3),
+                "count": cumulative[-1]
+            }
+        }
+
+class RunMetrics:
+    """
+    Per-phase instrumentation of an analysis run, broken down by environment.
+
+    Code runs a phase inside `with metrics.phase(name, env)`; the phase and environment are
+    tracked per thread, so concurrent environments and fetch workers are attributed correctly.
+    Phase seconds are summed over threads, so a phase run by several workers can exceed the
+    wall time. GitHub API responses are attributed to the phase of the thread that made them
+    through observe_response(), which GitHubClient calls for every response it receives.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started_at = time.time()
+        self._started = clock()
+        self._phases = {}
+        self._env_seconds = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def current_env(self):
+        return getattr(self._local, "env", None)
+
+    def _get(self, env, name):
+        key = (env or SHARED_ENV, name)
+        phase = self._phases.get(key)
+        if phase is None:
+            phase = self._phases[key] = PhaseMetrics()
+        return phase
+
+    @contextmanager
+    def phase(self, name, env=None):
+        env = env or self.current_env()
+        previous = (getattr(self._local, "env", None), getattr(self._local, "phase", None))
+        self._local.env, self._local.phase = env, name
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - start
+            self._local.env, self._local.phase = previous
+            with self._lock:
+                metrics = self._get(env, name)
+                metrics.seconds += elapsed
+                metrics.calls += 1
+
+    @contextmanager
+    def environment(self, env):
+        """
+        Attributes everything the current thread does to `env` and records its wall time.
+        """
+        previous = getattr(self._local, "env", None)
+        self._local.env = env
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self._local.env = previous
+            with self._lock:
+                self._env_seconds[env] = self._env_seconds.get(env, 0.0) + self.clock() - start
+
+    def observe_response(self, response, elapsed):
+        env = getattr(self._local, "env", None)
+        name = getattr(self._local, "phase", None) or OTHER_PHASE
+        with self._lock:
+            self._get(env, name).observe_request(response.status_code, elapsed, len(response.content or b""))
+
+    def snapshot(self, env, rate_limit=None):
+        """
+        Returns the metrics of `env` and the shared phases as a JSON-serializable dict.
+        """
+        with self._lock:
+            phases = {name: metrics.to_dict() for (phase_env, name), metrics in sorted(self._phases.items())
+                      if phase_env == env}
+            shared = {name: metrics.to_dict() for (phase_env, name), metrics in sorted(self._phases.items())
+                      if phase_env == SHARED_ENV}
+            env_seconds = self._env_seconds.get(env, 0.0)
+        return {
+            "env": env,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "run_seconds": round(self.clock() - self._started, 3),
+            "analysis_seconds": round(env_seconds, 3),
+            "phases": phases,
+            "shared_phases": shared,
+            "rate_limit": dict(rate_limit or {}, used=sum(phase["rate_limit_used"] for phase in phases.values()))
+        }
+
+    def to_json(self, env, rate_limit=None):
+        return json.dumps(self.snapshot(env, rate_limit), indent=4)
+
+    def to_prometheus(self, rate_limit=None):
+        """
+        Returns all metrics of the run in the Prometheus text exposition format.
+        """
+        with self._lock:
+            phases = sorted(self._phases.items())
+            env_seconds = sorted(self._env_seconds.items())
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+
+        def labels(env, name):
+            return f'env="{env}",phase="{name}"'
+
+        for attribute, help_text in [
+            ("seconds", "Seconds spent in the phase during the last run, summed over threads"),
+            ("requests", "GitHub API requests made during the phase in the last run"),
+            ("rate_limit_used", "GitHub API requests of the phase counted against the rate limit in the last run"),
+            ("bytes_received", "Bytes received from the GitHub API during the phase in the last run")
+        ]:
+            family(f"phase_{attribute}", "gauge", help_text)
+            for (env, name), metrics in phases:
+                lines.append(f"{METRIC_PREFIX}_phase_{attribute}{{{labels(env, name)}}} {getattr(metrics, attribute)}")
+
+        family("request_duration_seconds", "histogram", "Latency of GitHub API requests in the last run")
+        for (env, name), metrics in phases:
+            cumulative = metrics.cumulative_latency_counts()
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), cumulative):
+                lines.append(f'{METRIC_PREFIX}_request_duration_seconds_bucket{{{labels(env, name)},le="{bound}"}} {count}')
+            lines.append(f"{METRIC_PREFIX}_request_duration_seconds_sum{{{labels(env, name)}}} {metrics.latency_sum}")
+            lines.append(f"{METRIC_PREFIX}_request_duration_seconds_count{{{labels(env, name)}}} {cumulative[-1]}")
+
+        family("environment_seconds", "gauge", "Wall seconds spent analyzing the environment in the last run")
+        for env, seconds in env_seconds:
+            lines.append(f'{METRIC_PREFIX}_environment_seconds{{env="{env}"}} {seconds}')
+        family("run_seconds", "gauge", "Wall seconds of the last run")
+        lines.append(f"{METRIC_PREFIX}_run_seconds {self.clock() - self._started}")
+        family("last_run_timestamp_seconds", "gauge", "Start time of the last run")
+        lines.append(f"{METRIC_PREFIX}_last_run_timestamp_seconds {self.started_at}")
+        for key in ("remaining", "limit"):
+            value = (rate_limit or {}).get(key)
+            if value is not None:
+                family(f"rate_limit_{key}", "gauge", f"GitHub API rate limit {key} at the end of the last run")
+                lines.append(f"{METRIC_PREFIX}_rate_limit_{key} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,62 @@
+import gzip
+import os
+
+from activityLog import ActivityLog, WARNING, iter_lines, list_segments, seal_segment
+
+def open_log(tmp_path, sealed, **kwargs):
+    return ActivityLog(str(tmp_path / "activity_log_10-18-2026_prod.log"), echo=False, on_seal=sealed.append, **kwargs)
+
+def test_seal_segment_is_deterministic(tmp_path):
+    contents = []
+    for name in ("a", "b"):
+        path = tmp_path / f"{name}.0001.log"
+        path.write_text("line\n")
+        sealed_path = seal_segment(str(path))
+        assert not path.exists()
+        with open(sealed_path, "rb") as f:
+            contents.append(f.read())
+    assert contents[0] == contents[1]
+    assert gzip.decompress(contents[0]) == b"line\n"
+
+def test_segments_are_sealed_at_the_size_limit(tmp_path):
+    sealed = []
+    activity_log = open_log(tmp_path, sealed, segment_max_bytes=10)
+    activity_log.info("first line")
+    activity_log.info("second line")
+    activity_log.info("third")
+    activity_log.seal()
+
+    assert [os.path.basename(path) for path in sealed] == [
+        "activity_log_10-18-2026_prod.0001.log.gz",
+        "activity_log_10-18-2026_prod.0002.log.gz",
+        "activity_log_10-18-2026_prod.0003.log.gz",
+    ]
+    assert list(iter_lines(activity_log.filepath)) == ["first line\n", "second line\n", "third\n"]
+
+def test_close_leaves_the_open_segment_for_the_next_run(tmp_path):
+    sealed = []
+    activity_log = open_log(tmp_path, sealed)
+    activity_log.info("sealed by the first run")
+    activity_log.seal()
+    activity_log.info("logged after persisting")
+    activity_log.close()
+    assert len(sealed) == 1
+    assert [(sequence, sealed) for sequence, _, sealed in list_segments(activity_log.filepath)] == [(1, True), (2, False)]
+
+    # The next run seals and reports the segment left open, but not the one already reported
+    next_sealed = []
+    next_log = open_log(tmp_path, next_sealed)
+    next_log.info("second run")
+    next_log.seal()
+    assert [os.path.basename(path) for path in next_sealed] == [
+        "activity_log_10-18-2026_prod.0002.log.gz",
+        "activity_log_10-18-2026_prod.0003.log.gz",
+    ]
+    assert list(iter_lines(next_log.filepath)) == ["sealed by the first run\n", "logged after persisting\n", "second run\n"]
+
+def test_messages_below_the_level_are_dropped(tmp_path):
+    sealed = []
+    activity_log = open_log(tmp_path, sealed, level=WARNING)
+    activity_log.info("dropped")
+    activity_log.seal()
+    assert sealed == []
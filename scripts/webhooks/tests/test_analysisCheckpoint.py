@@ -0,0 +1,99 @@
+import json
+import time
+
+from analysisCheckpoint import AnalysisCheckpoint, atomic_write, get_checkpoint_filepath
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def load(artifacts_path, **kwargs):
+    return AnalysisCheckpoint.load(str(artifacts_path), "prod", atomic_write, **kwargs)
+
+def test_missing_checkpoint_is_complete(tmp_path):
+    checkpoint = load(tmp_path)
+    assert checkpoint.complete
+    assert not checkpoint.resumable
+    assert checkpoint.latest_attempts == {}
+
+def test_interrupted_pass_resumes_from_the_next_page(tmp_path):
+    checkpoint = load(tmp_path, interval_seconds=0)
+    checkpoint.start(since_timestamp=1000)
+    checkpoint.page_done("https://api.github.com/page2", [{"id": 5}, {"id": 7}, {"id": 6}])
+
+    resumed = load(tmp_path)
+    assert resumed.resumable
+    assert resumed.next_url == "https://api.github.com/page2"
+    assert resumed.since_timestamp == 1000
+    assert resumed.newest_delivery_id == 7
+    assert resumed.pages == 1
+
+def test_finished_pass_is_not_resumable(tmp_path):
+    checkpoint = load(tmp_path)
+    checkpoint.start(since_timestamp=1000)
+    checkpoint.page_done(None, [{"id": 1}])
+    checkpoint.finish()
+
+    resumed = load(tmp_path)
+    assert resumed.complete
+    assert not resumed.resumable
+
+def test_pass_stopped_before_the_last_page_stays_incomplete(tmp_path):
+    checkpoint = load(tmp_path)
+    checkpoint.start(since_timestamp=1000)
+    checkpoint.page_done("https://api.github.com/page2", [{"id": 1}])
+    checkpoint.finish()
+
+    assert load(tmp_path).resumable
+
+def test_pages_are_saved_at_most_once_per_interval(tmp_path):
+    clock = FakeClock()
+    filepath = get_checkpoint_filepath(str(tmp_path), "prod")
+    checkpoint = AnalysisCheckpoint(filepath, atomic_write, interval_seconds=30, clock=clock)
+    checkpoint.start(since_timestamp=0)
+
+    checkpoint.page_done("page2", [])
+    assert not (tmp_path / "analysis_checkpoint_prod.json").exists()
+
+    clock.now = 30
+    checkpoint.page_done("page3", [])
+    with open(filepath) as f:
+        assert json.load(f)["next_url"] == "page3"
+
+def test_out_of_time_after_the_deadline():
+    clock = FakeClock()
+    checkpoint = AnalysisCheckpoint("unused", atomic_write, deadline=10, clock=clock)
+    assert not checkpoint.out_of_time()
+    clock.now = 10
+    assert checkpoint.out_of_time()
+    assert not AnalysisCheckpoint("unused", atomic_write, clock=clock).out_of_time()
+
+def test_latest_attempts_round_trip_and_expire(tmp_path):
+    now = time.time()
+    checkpoint = load(tmp_path)
+    checkpoint.latest_attempts.update({
+        "recent": [30, now - 60],
+        "undated": [40, None],
+        "expired": [20, now - 4 * 24 * 60 * 60],
+    })
+    checkpoint.finish()
+
+    assert load(tmp_path).latest_attempts == {"recent": [30, now - 60], "undated": [40, None]}
+
+def test_saving_the_same_state_writes_the_same_file(tmp_path):
+    filepath = get_checkpoint_filepath(str(tmp_path), "prod")
+    checkpoint = load(tmp_path)
+    checkpoint.start(since_timestamp=1000)
+    checkpoint.page_done(None, [{"id": 1}])
+    checkpoint.latest_attempts.update({"b": [2, None], "a": [1, None]})
+    checkpoint.finish()
+    with open(filepath) as f:
+        first = f.read()
+
+    resumed = load(tmp_path)
+    resumed.finish()
+    with open(filepath) as f:
+        assert f.read() == first
@@ -0,0 +1,35 @@
+import subprocess
+
+from artifactManifest import ArtifactManifest, git_blob_sha
+
+def test_git_blob_sha_matches_git():
+    content = b"webhook analysis\n"
+    expected = subprocess.run(["git", "hash-object", "--stdin"], input=content, capture_output=True,
+                              check=True).stdout.decode().strip()
+    assert git_blob_sha(content) == expected
+
+def test_unchanged_skips_only_recorded_content(tmp_path):
+    manifest = ArtifactManifest(str(tmp_path / ".artifact_manifest.json"))
+    manifest.record("artifacts/report.json", git_blob_sha(b"{}"))
+
+    assert manifest.unchanged("artifacts/report.json", b"{}")
+    assert not manifest.unchanged("artifacts/report.json", b"{\"total\": 1}")
+    assert not manifest.unchanged("artifacts/other.json", b"{}")
+    assert manifest.skipped == 1
+    assert manifest.bytes_skipped == 2
+
+def test_manifest_round_trip(tmp_path):
+    filepath = str(tmp_path / ".artifact_manifest.json")
+    manifest = ArtifactManifest(filepath)
+    manifest.record("artifacts/report.json", git_blob_sha(b"{}"))
+    manifest.save()
+
+    loaded = ArtifactManifest.load(filepath)
+    assert loaded.get("artifacts/report.json") == git_blob_sha(b"{}")
+    assert loaded.unchanged("artifacts/report.json", b"{}")
+
+def test_unreadable_manifest_is_empty(tmp_path):
+    filepath = tmp_path / ".artifact_manifest.json"
+    filepath.write_text("not json")
+    assert ArtifactManifest.load(str(filepath)).blobs == {}
+    assert ArtifactManifest.load(str(tmp_path / "missing.json")).blobs == {}
@@ -0,0 +1,73 @@
+from attemptChains import AttemptChains
+from deliveryRecord import DELIVERED, TIMED_OUT
+
+def delivery(delivery_id, guid, status_code, delivered_at, redelivery=False):
+    return {"id": delivery_id, "guid": guid, "status_code": status_code,
+            "delivered_at": delivered_at, "redelivery": redelivery}
+
+def test_latest_attempts_keeps_the_first_listed_attempt_of_each_guid():
+    chains = AttemptChains()
+    # Listed newest first: the redelivery of "a" comes before its original attempt
+    page = [
+        delivery(30, "a", 202, "2026-10-18T10:05:00Z", redelivery=True),
+        delivery(20, "b", 0, "2026-10-18T10:01:00Z"),
+        delivery(10, "a", 0, "2026-10-18T10:00:00Z"),
+    ]
+    assert [d["id"] for d in chains.latest_attempts(page)] == [30, 20]
+    assert chains.collapsed == 1
+
+    chain = chains.get("a")
+    assert chain.attempts == 2
+    assert chain.outcome == DELIVERED
+    assert chain.time_to_success == 300
+    assert chains.get("b").outcome == TIMED_OUT
+
+def test_latest_attempts_keeps_deliveries_without_a_guid():
+    chains = AttemptChains()
+    page = [{"id": 2, "status_code": 202}, {"id": 1, "status_code": 0}]
+    assert chains.latest_attempts(page) == page
+    assert chains.collapsed == 0
+
+def test_latest_attempts_collapses_across_pages():
+    chains = AttemptChains()
+    chains.latest_attempts([delivery(30, "a", 202, "2026-10-18T10:05:00Z", redelivery=True)])
+    assert chains.latest_attempts([delivery(10, "a", 0, "2026-10-18T10:00:00Z")]) == []
+    assert chains.get("a").attempts == 2
+
+def test_latest_attempts_records_redeliveries_for_later_runs():
+    latest_attempts = {}
+    chains = AttemptChains(latest_attempts)
+    chains.latest_attempts([
+        delivery(30, "a", 202, "2026-10-18T10:05:00Z", redelivery=True),
+        delivery(20, "b", 202, "2026-10-18T10:01:00Z"),
+    ])
+    # Only redeliveries are remembered; an original attempt is always the oldest of its chain
+    assert list(latest_attempts) == ["a"]
+    assert latest_attempts["a"][0] == 30
+
+    # A later run that only lists the original attempt does not classify it again
+    later = AttemptChains(latest_attempts)
+    assert later.latest_attempts([delivery(10, "a", 0, "2026-10-18T10:00:00Z")]) == []
+    assert later.collapsed == 1
+    assert later.get("a") is None
+
+def test_latest_attempts_keeps_attempts_newer_than_the_recorded_one():
+    chains = AttemptChains({"a": [30, None]})
+    newer = delivery(40, "a", 202, "2026-10-18T10:10:00Z", redelivery=True)
+    assert chains.latest_attempts([newer]) == [newer]
+    assert chains.latest_attempt_ids["a"][0] == 40
+
+def test_summary_counts_outcomes_of_latest_attempts():
+    chains = AttemptChains()
+    chains.latest_attempts([
+        delivery(30, "a", 202, "2026-10-18T10:05:00Z", redelivery=True),
+        delivery(20, "b", 502, "2026-10-18T10:01:00Z"),
+        delivery(10, "a", 0, "2026-10-18T10:00:00Z"),
+    ])
+    summary = chains.summary()
+    assert summary["deliveries"] == 2
+    assert summary["attempts_collapsed"] == 1
+    assert summary["retried"] == 1
+    assert summary["outcomes"]["delivered"] == 1
+    assert summary["outcomes"]["timed_out"] == 1
+    assert summary["median_time_to_success_seconds"] == 300
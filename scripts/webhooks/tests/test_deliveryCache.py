@@ -0,0 +1,38 @@
+import os
+
+from deliveryCache import DeliveryDetailCache, TMP_FILE_GRACE_SECONDS
+
+def test_put_and_get(tmp_path):
+    cache = DeliveryDetailCache(str(tmp_path))
+    assert cache.get(1, 2) is None
+    cache.put(1, 2, {"id": 2})
+    assert cache.get(1, 2) == {"id": 2}
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_evict_drops_old_entries_then_least_recently_used(tmp_path):
+    cache = DeliveryDetailCache(str(tmp_path), max_age_seconds=100)
+    for delivery_id in (1, 2, 3):
+        cache.put(1, delivery_id, {"id": delivery_id})
+    paths = [cache._entry_path(1, delivery_id) for delivery_id in (1, 2, 3)]
+    os.utime(paths[0], (0, 0))
+    os.utime(paths[1], (900, 900))
+    os.utime(paths[2], (950, 950))
+    cache.max_bytes = os.path.getsize(paths[2])
+
+    assert cache.evict(now=1000) == 2
+    assert [os.path.exists(path) for path in paths] == [False, False, True]
+
+def test_evict_leaves_temporary_files_of_concurrent_writers(tmp_path):
+    cache = DeliveryDetailCache(str(tmp_path), max_bytes=0)
+    directory = tmp_path / "1"
+    directory.mkdir()
+    writing = directory / "writing.tmp"
+    writing.write_bytes(b"partial")
+    crashed = directory / "crashed.tmp"
+    crashed.write_bytes(b"partial")
+    os.utime(crashed, (0, 0))
+
+    cache.evict(now=TMP_FILE_GRACE_SECONDS + 1)
+    assert writing.exists()
+    assert not crashed.exists()
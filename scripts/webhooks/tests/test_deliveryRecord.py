@@ -0,0 +1,21 @@
+import pytest
+
+from deliveryRecord import attempt_outcome, DELIVERED, BLOCKED, TIMED_OUT, FAILED
+
+@pytest.mark.parametrize("status_code, outcome", [
+    (0, TIMED_OUT),
+    (None, TIMED_OUT),
+    (500, TIMED_OUT),
+    (502, TIMED_OUT),
+    (504, TIMED_OUT),
+    (200, BLOCKED),
+    (201, DELIVERED),
+    (202, DELIVERED),
+    (204, DELIVERED),
+    (301, FAILED),
+    (400, FAILED),
+    (404, FAILED),
+    (429, FAILED),
+])
+def test_attempt_outcome(status_code, outcome):
+    assert attempt_outcome(status_code) == outcome
@@ -0,0 +1,20 @@
+from journaledStore import JournaledJsonStore
+
+class TimedOutDeliveryStore(JournaledJsonStore):
+    """
+    Timed-out deliveries of one day and environment, indexed by `delivery_id` (the GitHub delivery guid).
+
+    The artifact is a JSON array of records. Records are journaled as they are added or
+    updated and the array is written once by export() at the end of the run.
+    """
+    key_field = "delivery_id"
+
+    @property
+    def records(self):
+        return self.entries
+
+    def add(self, record):
+        """
+        Adds a record unless its `delivery_id` is already stored. Returns True if it was added.
+        """
+        return self._add(record)
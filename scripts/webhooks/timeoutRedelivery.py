@@ -0,0 +1,237 @@
+import time
+
+import requests
+
+from activityLog import DEBUG, INFO, WARNING
+from deliveryRecord import attempt_outcome, DELIVERED, BLOCKED, TIMED_OUT, FAILED
+from incrementalState import delivered_at_epoch
+
+DEFAULT_REDELIVERY_RATE = 0.5  # redeliveries per second
+DEFAULT_REDELIVERY_BURST = 5
+MIN_REDELIVERY_RATE = 1.0 / 60
+DEFAULT_MAX_REDELIVERY_ATTEMPTS = 3
+OUTCOME_POLL_INTERVAL_SECONDS = 15
+DEFAULT_OUTCOME_WAIT_SECONDS = 60
+# Attempts whose outcome never showed up are sent again after this long
+PENDING_EXPIRY_SECONDS = 60 * 60
+# Allowance for clock differences with GitHub when matching listed attempts to redeliveries
+CLOCK_SKEW_SECONDS = 60
+PER_PAGE = 100
+
+# Redelivery states recorded in the timed-out store, besides the outcomes of an attempt
+PENDING = "pending"
+ABANDONED = "abandoned"
+EXPIRED = "expired"
+FINAL_STATES = {DELIVERED, BLOCKED, FAILED, ABANDONED, EXPIRED}
+
+class TokenBucket:
+    """
+    Allows `rate` operations per second on average with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        self._refill()
+        if self.tokens < 1:
+            self.sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+class AdaptivePacer(TokenBucket):
+    """
+    Token bucket whose rate follows the health of the receiving endpoint: each redelivery that
+    times out again halves the rate (down to `min_rate`) and drops the saved-up burst, each
+    successful one raises it by a tenth of `max_rate`.
+    """
+
+    def __init__(self, max_rate, capacity, min_rate=MIN_REDELIVERY_RATE, clock=time.monotonic, sleep=time.sleep):
+        super().__init__(max_rate, capacity, clock, sleep)
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+
+    def on_outcome(self, outcome):
+        self._refill()
+        if outcome == TIMED_OUT:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+        elif outcome in (DELIVERED, BLOCKED):
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+class TimeoutRedeliverer:
+    """
+    Redelivers the deliveries recorded in TimedOutDeliveryStores and tracks their outcome.
+
+    `stores` are the stores of the days GitHub still keeps deliveries for, newest first, so
+    deliveries recorded on earlier days keep being retried and settled. A delivery recorded
+    on several days is redelivered once and its outcome is stored in every one of them.
+
+    Redeliveries are paced by an AdaptivePacer. GitHub answers a redelivery request right away
+    and lists the new attempt (same guid, `redelivery` set) once the endpoint responded, so the
+    deliveries list is polled for the attempts of pending redeliveries; their outcome feeds the
+    pacer and is stored in the record's `redelivery` field together with the attempt count.
+    Deliveries that time out again are retried by later runs until `max_attempts` is reached.
+    """
+
+    def __init__(self, client, deliveries_url, stores, log, rate=DEFAULT_REDELIVERY_RATE, burst=DEFAULT_REDELIVERY_BURST,
+                 max_attempts=DEFAULT_MAX_REDELIVERY_ATTEMPTS, clock=time.time, sleep=time.sleep):
+        self.client = client
+        self.deliveries_url = deliveries_url
+        self.stores = list(stores)
+        self._stores_of = {}
+        self.log = log
+        self.max_attempts = max_attempts
+        self.clock = clock
+        self.sleep = sleep
+        self.pacer = AdaptivePacer(rate, burst, sleep=sleep)
+        self.pending = {}
+        self.summary = {"candidates": 0, "redelivered": 0, "errors": 0, "deferred": 0, DELIVERED: 0, BLOCKED: 0,
+                        TIMED_OUT: 0, FAILED: 0, ABANDONED: 0, EXPIRED: 0}
+        self._last_poll = 0
+
+    def _candidates(self):
+        """
+        Returns the guids of the records to redeliver, oldest first, and picks up the
+        redeliveries a previous run left pending.
+        """
+        now = self.clock()
+        records = {}
+        for store in self.stores:
+            for guid, record in store.records.items():
+                # The newest store's copy of a record is the one redelivered
+                records.setdefault(guid, record)
+                self._stores_of.setdefault(guid, []).append(store)
+        candidates = []
+        for record in sorted(records.values(), key=lambda record: record.get("timestamp") or 0):
+            state = record.get("redelivery") or {}
+            if not record.get("hook_delivery_id") or state.get("status") in FINAL_STATES:
+                continue
+            if state.get("status") == PENDING and now - state.get("last_attempt_at", 0) < PENDING_EXPIRY_SECONDS:
+                self.pending[record["delivery_id"]] = state["last_attempt_at"]
+                continue
+            candidates.append(record["delivery_id"])
+        return candidates
+
+    def _get(self, guid):
+        return self._stores_of[guid][0].get(guid)
+
+    def _update(self, guid, fields):
+        for store in self._stores_of[guid]:
+            store.update(guid, fields)
+
+    def run(self, outcome_wait_seconds=DEFAULT_OUTCOME_WAIT_SECONDS, deadline=None):
+        """
+        Redelivers every candidate, then waits up to `outcome_wait_seconds` for the outcomes of
+        the redeliveries still pending. With a `deadline` (time.monotonic() value) no redelivery
+        is sent and no outcome awaited past it; the remaining candidates are left for a later
+        run. Returns a summary of the run.
+        """
+        candidates = self._candidates()
+        self.summary["candidates"] = len(candidates)
+        if self.pending:
+            self.poll_outcomes()
+
+        for index, guid in enumerate(candidates):
+            if deadline is not None and time.monotonic() >= deadline:
+                self.summary["deferred"] = len(candidates) - index
+                self.log(f"Out of time, leaving {self.summary['deferred']} timed-out deliveries for a later run", WARNING)
+                break
+            self.pacer.acquire()
+            self.redeliver(guid)
+            if self.pending and self.clock() - self._last_poll >= OUTCOME_POLL_INTERVAL_SECONDS:
+                self.poll_outcomes()
+
+        if deadline is not None:
+            outcome_wait_seconds = min(outcome_wait_seconds, max(deadline - time.monotonic(), 0))
+        wait_until = self.clock() + outcome_wait_seconds
+        while self.pending:
+            self.poll_outcomes()
+            if not self.pending or self.clock() >= wait_until:
+                break
+            self.sleep(min(OUTCOME_POLL_INTERVAL_SECONDS, max(wait_until - self.clock(), 0)))
+
+        self.summary["pending"] = len(self.pending)
+        self.summary["final_rate"] = round(self.pacer.rate, 4)
+        return self.summary
+
+    def redeliver(self, guid):
+        record = self._get(guid)
+        state = dict(record.get("redelivery") or {})
+        try:
+            response = self.client.post(f"{self.deliveries_url}/{record['hook_delivery_id']}/attempts")
+        except requests.RequestException as e:
+            # Redeliveries are not retried: GitHub may have carried this one out before the connection
+            # failed, so it is treated as sent and settled from the deliveries list like any other
+            self.log(f"Redelivery of delivery {guid} got no response, waiting for its outcome: {e!r}", WARNING)
+            response = None
+        if response is not None and response.status_code == 404:
+            # GitHub only keeps deliveries for a limited time
+            state["status"] = EXPIRED
+            self._update(guid, {"redelivery": state})
+            self.summary[EXPIRED] += 1
+            self.log(f"Delivery {guid} can no longer be redelivered", WARNING)
+            return False
+        if response is not None and response.status_code not in (200, 201, 202):
+            self.summary["errors"] += 1
+            self.log(f"Failed to redeliver delivery {guid}: {response.status_code} {response.text[:200]}", WARNING)
+            return False
+
+        now = self.clock()
+        state.update(status=PENDING, attempts=state.get("attempts", 0) + 1, last_attempt_at=now)
+        self._update(guid, {"redelivery": state})
+        self.pending[guid] = now
+        self.summary["redelivered"] += 1
+        self.log(f"Redelivered timed-out delivery {guid} (attempt {state['attempts']})", DEBUG)
+        return True
+
+    def poll_outcomes(self):
+        """
+        Scans the deliveries list, newest first, back to the oldest pending redelivery and
+        settles every pending redelivery whose attempt is listed.
+        """
+        self._last_poll = self.clock()
+        if not self.pending:
+            return
+        oldest = min(self.pending.values()) - CLOCK_SKEW_SECONDS
+        for page in self.client.paginate(self.deliveries_url, params={"per_page": PER_PAGE}):
+            for item in page:
+                delivered_at = delivered_at_epoch(item)
+                if delivered_at is not None and delivered_at < oldest:
+                    return
+                sent_at = self.pending.get(item.get("guid"))
+                if sent_at is None or not item.get("redelivery"):
+                    continue
+                if delivered_at is not None and delivered_at < sent_at - CLOCK_SKEW_SECONDS:
+                    continue
+                # Newest first, so the first attempt found is the latest one
+                self._settle(item)
+                if not self.pending:
+                    return
+
+    def _settle(self, item):
+        guid = item["guid"]
+        del self.pending[guid]
+        outcome = attempt_outcome(item.get("status_code", 0))
+        self.pacer.on_outcome(outcome)
+        state = dict(self._get(guid).get("redelivery") or {})
+        status = outcome
+        if outcome == TIMED_OUT and state.get("attempts", 0) >= self.max_attempts:
+            status = ABANDONED
+        state.update(status=status, last_status_code=item.get("status_code"), last_attempt_id=item.get("id"),
+                     last_duration=item.get("duration"))
+        self._update(guid, {"redelivery": state})
+        self.summary[status] += 1
+        level = INFO if outcome in (DELIVERED, BLOCKED) else WARNING
+        self.log(f"Redelivery of {guid} {status} (status {item.get('status_code')}, attempt {state.get('attempts')}, "
+                 f"rate now {self.pacer.rate:.3f}/s)", level)